@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""End-to-end setup() benchmark against local SCM stand-ins, local bare git remotes and a fake stk binary.
+
+    python benchmarks/bench.py --repos 20 --latency-ms 30
+    python benchmarks/bench.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench.py --compare benchmarks/baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+SETUP_ACTION = ROOT / "stackspot-actions" / "setup-stackspot-workflows"
+sys.path.insert(0, str(SETUP_ACTION))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from helpers import stk as stk_module  # noqa: E402
+from helpers.exceptions import CloningRepoException  # noqa: E402
+from helpers.git_helper import Git  # noqa: E402
+from helpers.http_client import HttpClient  # noqa: E402
+from helpers.metadata_cache import MetadataCache  # noqa: E402
+from helpers.rate_limit import RateLimiter  # noqa: E402
+from helpers.stk import Stk  # noqa: E402
+from helpers.tracing import tracer  # noqa: E402
+from batch import BatchManifest, plan_batch, run_batch  # noqa: E402
+from main import GIT_BACKENDS, PROVIDERS  # noqa: E402
+from scm_standins import BITBUCKET_ACCESS_TOKEN, GitRemotes, ScmStandIns  # noqa: E402
+
+BENCH_PAT = "bench-pat"
+
+PROVIDER_INPUTS = {
+    "Github": lambda name: dict(org_name="bench-org", repo_name=name, pat=BENCH_PAT),
+    "Gitlab": lambda name: dict(group_name="group", project_name=name, project_key=name, pat=BENCH_PAT),
+    "Azure": lambda name: dict(org_name="bench-org", project_name="bench-project", repo_name=name, pat=BENCH_PAT),
+    "Bitbucket": lambda name: dict(
+        workspace_name="bench-ws", repo_name=name, project_key="BENCH", client_key="key", client_secret="secret"
+    ),
+}
+
+
+class StandInHttpClient(HttpClient):
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def _call(self, method: str, url: str, **kwargs):
+        if url.startswith(self.base_url):
+            # Pagination links from the stand-ins already point to them
+            return super()._call(method, url, **kwargs)
+        parts = urlsplit(url)
+        local_url = f"{self.base_url}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        return super()._call(method, local_url, **kwargs)
+
+
+def local_remotes_git(backend: type, remotes: GitRemotes) -> Git:
+    class LocalRemotesGit(backend):
+        def clone(self, clone_url: str, workdir: str, **kwargs):
+            # A real remote refuses a url without valid credentials
+            if urlsplit(clone_url).password not in (BENCH_PAT, BITBUCKET_ACCESS_TOKEN):
+                raise CloningRepoException()
+            name = urlsplit(clone_url).path.rstrip("/").split("/")[-1]
+            name = name[:-4] if name.endswith(".git") else name
+            return backend.clone(remotes.path(name).as_uri(), workdir, **kwargs)
+
+    return LocalRemotesGit()
+
+
+def percentile(values: List[float], percentile_value: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(percentile_value / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def bench_provider(provider_name: str, args, workspace: Path) -> Dict[str, float]:
+    remotes = GitRemotes(workspace / provider_name.lower() / "remotes")
+    standins = ScmStandIns(
+        remotes,
+        latency=args.latency_ms / 1000,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        rate_limit=args.rate_limit,
+        rate_window=args.rate_window,
+    )
+    base_url = standins.start()
+    try:
+        names = [f"bench-{provider_name.lower()}-{index}" for index in range(args.repos)]
+        for index, name in enumerate(names):
+            if index >= int(args.repos * args.missing_ratio):
+                remotes.create(name)
+        standins.azure_projects.add("bench-project")
+        standins.bitbucket_projects.add("BENCH")
+
+        metadata_cache = MetadataCache(args.metadata_cache, ttl=86400) if args.metadata_cache else None
+        http_client = StandInHttpClient(
+            base_url, rate_limiter=RateLimiter(enabled=not args.no_pacing), metadata_cache=metadata_cache
+        )
+        manifest = BatchManifest(
+            targets=[PROVIDER_INPUTS[provider_name](name) for name in names],
+            options=dict(
+                assume_yes=True,
+                concurrent=args.concurrency > 1,
+                io_workers=args.concurrency,
+                cpu_workers=args.cpu_workers,
+                save_strategy=args.save_strategy,
+            ),
+        )
+        tracer.spans.clear()
+        standins.reset_counters()
+        run_kwargs = dict(
+            stk=Stk(),
+            git=local_remotes_git(GIT_BACKENDS[args.git_backend], remotes),
+            http_client=http_client,
+            provider=provider_name,
+            component_path=str(ROOT),
+            target_path=str(workspace),
+            ref_branch=f"setup-scm-bench-{int(time.time())}",
+        )
+        start = time.monotonic()
+        plan = plan_batch(PROVIDERS[provider_name], manifest, **run_kwargs) if args.plan else None
+        entries = run_batch(PROVIDERS[provider_name], manifest, plan=plan, **run_kwargs)
+        elapsed = time.monotonic() - start
+        latencies = [span.duration for span in tracer.finished_spans() if span.name == "setup" and span.status == "ok"]
+        failures = [entry for entry in entries if entry.error]
+        for entry in failures[:3]:
+            logging.warning(f"{provider_name} {entry.target}: {entry.error}")
+        return dict(
+            repos=args.repos,
+            failed=len(failures),
+            seconds=elapsed,
+            throughput=args.repos / elapsed if elapsed else 0.0,
+            p50=percentile(latencies, 50),
+            p95=percentile(latencies, 95),
+            p99=percentile(latencies, 99),
+            requests_per_repo=sum(standins.requests.values()) / args.repos,
+            rate_limited=standins.rate_limited,
+            not_modified=standins.not_modified,
+        )
+    finally:
+        standins.stop()
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    regressions = []
+    for provider_name, result in results.items():
+        reference = baseline.get(provider_name)
+        if not reference:
+            continue
+        for metric in ("p50", "p95", "p99"):
+            if reference[metric] and result[metric] > reference[metric] * (1 + threshold):
+                regressions.append(f"{provider_name} {metric}: {reference[metric]:.3f}s -> {result[metric]:.3f}s")
+        if result["requests_per_repo"] > reference["requests_per_repo"] + 0.01:
+            regressions.append(
+                f"{provider_name} requests/repo: {reference['requests_per_repo']:.2f} -> {result['requests_per_repo']:.2f}"
+            )
+        if reference["throughput"] and result["throughput"] < reference["throughput"] * (1 - threshold):
+            regressions.append(
+                f"{provider_name} throughput: {reference['throughput']:.2f} -> {result['throughput']:.2f} repos/s"
+            )
+    return regressions
+
+
+def print_report(results: Dict[str, Dict]):
+    print(f"{'provider':<10} {'repos':>6} {'failed':>6} {'repos/s':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'req/repo':>9} {'429s':>5} {'304s':>5}")
+    for provider_name, result in results.items():
+        print(
+            f"{provider_name:<10} {result['repos']:>6} {result['failed']:>6} {result['throughput']:>8.2f} "
+            f"{result['p50']:>7.3f} {result['p95']:>7.3f} {result['p99']:>7.3f} {result['requests_per_repo']:>9.2f} {result.get('rate_limited', 0):>5} {result.get('not_modified', 0):>5}"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--providers", nargs="+", default=list(PROVIDER_INPUTS), choices=list(PROVIDER_INPUTS))
+    parser.add_argument("--repos", type=int, default=10)
+    parser.add_argument("--missing-ratio", type=float, default=0.0, help="share of repositories created by the setup")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency injected in every api response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of api responses replaced by a 502")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests allowed per window, 0 disables the limit")
+    parser.add_argument("--rate-window", type=float, default=1.0, help="seconds of each rate limit window")
+    parser.add_argument("--no-pacing", action="store_true", help="ignore the rate limit budget on the client side")
+    parser.add_argument("--metadata-cache", help="sqlite file of the metadata cache, kept between bench runs")
+    parser.add_argument("--stk-delay", type=float, default=0.0, help="seconds the fake stk binary takes to start")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--cpu-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--save-strategy", default="git", choices=["git", "api"])
+    parser.add_argument("--git-backend", default="git", choices=["git", "dulwich"])
+    parser.add_argument("--plan", action="store_true", help="plan every target first and apply only the planned stages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    logging.basicConfig(format="%(message)s", level=logging.INFO if args.verbose else logging.WARNING)
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    workspace = Path(tempfile.mkdtemp(prefix="stk-setup-bench-"))
+    os.environ.update(
+        FAKE_STK_DELAY=str(args.stk_delay),
+        STK_SETUP_JOURNAL=str(workspace / "journal"),
+        GIT_AUTHOR_NAME="bench", GIT_AUTHOR_EMAIL="bench@localhost",
+        GIT_COMMITTER_NAME="bench", GIT_COMMITTER_EMAIL="bench@localhost",
+        GIT_TERMINAL_PROMPT="0",
+    )
+    fake_stk = Path(__file__).resolve().parent / "fake_stk.py"
+    fake_stk.chmod(0o755)
+    stk_module.stk = str(fake_stk)
+    try:
+        results = {provider_name: bench_provider(provider_name, args, workspace) for provider_name in args.providers}
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    print_report(results)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
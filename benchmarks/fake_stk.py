@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# Stand-in for the stk binary: "apply plugin" renders workflow-templates/<provider> into the current directory.
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+RAW_BLOCK = re.compile(r"\{%-?\s*raw\s*-?%\}\s*|\s*\{%-?\s*endraw\s*-?%\}\s*$")
+
+
+def apply_plugin(args):
+    component_path = Path(args[0])
+    provider = args[args.index("--provider") + 1].lower()
+    templates = component_path / "workflow-templates" / provider
+    for template in templates.rglob("*"):
+        if not template.is_file():
+            continue
+        target = Path.cwd() / template.relative_to(templates)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(RAW_BLOCK.sub("", template.read_text()) + "\n")
+    (Path.cwd() / ".stk").mkdir(exist_ok=True)
+
+
+def main(args):
+    # Simulates the startup cost of the real binary
+    time.sleep(float(os.getenv("FAKE_STK_DELAY", "0")))
+    if args[:2] == ["apply", "plugin"]:
+        apply_plugin(args[2:])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
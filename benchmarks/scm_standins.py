@@ -0,0 +1,515 @@
+import hashlib
+import itertools
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+BITBUCKET_ACCESS_TOKEN = "bitbucket-token"
+
+class GitRemotes:
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> Path:
+        return self.root / f"{name}.git"
+
+    def create(self, name: str, with_main: bool = True):
+        with self._lock:
+            remote = self.path(name)
+            if remote.exists():
+                return
+            subprocess.run(["git", "init", "--quiet", "--bare", "-b", "main", str(remote)], check=True)
+            subprocess.run(["git", "config", "uploadpack.allowFilter", "true"], cwd=remote, check=True)
+            if not with_main:
+                return
+            seed = self.root / f".seed-{name}"
+            subprocess.run(["git", "init", "--quiet", "-b", "main", str(seed)], check=True)
+            (seed / "README.md").write_text(f"# {name}\n")
+            subprocess.run(["git", "add", "."], cwd=seed, check=True)
+            subprocess.run(["git", "commit", "--quiet", "-m", "init"], cwd=seed, check=True)
+            subprocess.run(["git", "push", "--quiet", str(remote), "main"], cwd=seed, check=True)
+            subprocess.run(["rm", "-rf", str(seed)], check=True)
+
+    def exists(self, name: str) -> bool:
+        return self.path(name).exists()
+
+    def head(self, name: str, branch: str = "main") -> Optional[str]:
+        result = subprocess.run(
+            ["git", "rev-parse", "--verify", "--quiet", f"refs/heads/{branch}"],
+            cwd=self.path(name), capture_output=True, text=True,
+        )
+        return result.stdout.strip() or None
+
+    def show(self, name: str, path: str, branch: str = "main") -> Optional[bytes]:
+        result = subprocess.run(["git", "show", f"{branch}:{path}"], cwd=self.path(name), capture_output=True)
+        return result.stdout if result.returncode == 0 else None
+
+
+Route = Tuple[str, re.Pattern, Callable]
+
+
+class ScmStandIns:
+    """Mimics the GitHub, GitLab, Azure DevOps and Bitbucket endpoints used by the api clients."""
+
+    def __init__(
+        self,
+        remotes: GitRemotes,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        rate_limit: int = 0,
+        rate_window: float = 1.0,
+    ):
+        self.remotes = remotes
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.window_start = time.time()
+        self.window_requests = 0
+        self.rate_limited = 0
+        self.not_modified = 0
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.ids = itertools.count(1)
+        self.hooks: Dict[str, List[dict]] = {}
+        self.triggers: Dict[str, List[dict]] = {}
+        # Open pull requests by repository and source branch
+        self.pull_requests: Dict[Tuple[str, str], dict] = {}
+        self.bitbucket_pipelines: Set[str] = set()
+        self.projects: Dict[str, int] = {}
+        self.project_names: Dict[int, str] = {}
+        self.azure_projects = set()
+        self.gitlab_groups: Dict[str, dict] = {"group": {"id": 1, "name": "group", "full_path": "group"}}
+        self.bitbucket_projects = set()
+        self.server: Optional[ThreadingHTTPServer] = None
+        self._lock = threading.Lock()
+        self.routes: List[Route] = []
+        self._register_routes()
+
+    # ---------------------------------------------------------------- lifecycle
+    def start(self) -> str:
+        standins = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes, Nagle plus delayed acks would add 40ms to every response
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                standins.dispatch(self)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+        class Server(ThreadingHTTPServer):
+            # Concurrent clients open many connections at once, the default backlog of 5 drops them
+            request_queue_size = 1024
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests.clear()
+            self.rate_limited = 0
+            self.not_modified = 0
+
+    # ---------------------------------------------------------------- dispatch
+    def route(self, method: str, pattern: str):
+        def register(handler: Callable):
+            self.routes.append((method, re.compile(f"^{pattern}$"), handler))
+            return handler
+        return register
+
+    def dispatch(self, request: BaseHTTPRequestHandler):
+        length = int(request.headers.get("Content-Length") or 0)
+        body = request.rfile.read(length) if length else b""
+        parts = urlsplit(request.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        with self._lock:
+            self.requests[request.command] += 1
+            fail = self.error_rate and self.random.random() < self.error_rate
+            headers = self._rate_limit_headers()
+        if self.latency:
+            time.sleep(self.latency)
+        if headers.get("Retry-After"):
+            return self._reply(request, 429, {"message": "rate limited"}, headers)
+        if fail:
+            return self._reply(request, 502, {"message": "injected failure"}, headers)
+        for method, pattern, handler in self.routes:
+            match = pattern.match(parts.path)
+            if method == request.command and match:
+                status, payload, *extra_headers = handler(request=request, body=body, query=query, **match.groupdict())
+                return self._reply(request, status, payload, dict(headers, **(extra_headers[0] if extra_headers else {})))
+        self._reply(request, 404, {"message": f"no stand-in for {request.command} {parts.path}"}, headers)
+
+    def _rate_limit_headers(self) -> Dict[str, str]:
+        if not self.rate_limit:
+            return {}
+        now = time.time()
+        if now >= self.window_start + self.rate_window:
+            self.window_start, self.window_requests = now, 0
+        self.window_requests += 1
+        reset = self.window_start + self.rate_window
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(max(self.rate_limit - self.window_requests, 0)),
+            "X-RateLimit-Reset": f"{reset:.3f}",
+        }
+        if self.window_requests > self.rate_limit:
+            self.rate_limited += 1
+            headers["Retry-After"] = f"{max(reset - now, 0.001):.3f}"
+        return headers
+
+    def _reply(self, request: BaseHTTPRequestHandler, status: int, payload, headers: Optional[Dict[str, str]] = None):
+        if isinstance(payload, bytes):
+            data, content_type = payload, "application/octet-stream"
+        else:
+            data, content_type = json.dumps(payload if payload is not None else {}).encode(), "application/json"
+        if request.command == "GET" and status == 200:
+            # Like the real providers, unchanged bodies come back as an empty 304
+            etag = f'"{hashlib.sha1(data).hexdigest()}"'
+            headers = dict(headers or {}, ETag=etag)
+            if request.headers.get("If-None-Match") == etag:
+                status, data = 304, b""
+                with self._lock:
+                    self.not_modified += 1
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(data)
+
+    def _next_id(self) -> int:
+        with self._lock:
+            return next(self.ids)
+
+    @staticmethod
+    def _json(body: bytes) -> dict:
+        return json.loads(body) if body else {}
+
+    @staticmethod
+    def _page(request: BaseHTTPRequestHandler, items: list, query: dict):
+        per_page, page = int(query.get("per_page", 30)), int(query.get("page", 1))
+        parts = urlsplit(request.path)
+        headers = {}
+        if page * per_page < len(items):
+            next_query = urlencode(dict(query, per_page=per_page, page=page + 1))
+            headers["Link"] = f'<http://{request.headers["Host"]}{parts.path}?{next_query}>; rel="next"'
+        return 200, items[(page - 1) * per_page:page * per_page], headers
+
+    def _open_pull_request(self, repo: str, branch: str, pull_request: dict):
+        with self._lock:
+            self.pull_requests[(repo, branch)] = pull_request
+        return 201, pull_request
+
+    def _pull_requests(self, repo: str, branch: str) -> List[dict]:
+        pull_request = self.pull_requests.get((repo, branch))
+        return [pull_request] if pull_request else []
+
+    def _repo_status(self, name: str):
+        return (200, {"id": name, "name": name}) if self.remotes.exists(name) else (404, {"message": "Not Found"})
+
+    def _file(self, name: str, path: str, branch: str = "main"):
+        content = self.remotes.show(name, path, branch) if self.remotes.exists(name) else None
+        return (200, content) if content is not None else (404, {"message": "Not Found"})
+
+    # ---------------------------------------------------------------- routes
+    def _register_routes(self):
+        route = self.route
+        gh = "/api.github.com"
+
+        @route("GET", gh + r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)")
+        def github_get_repository(repo, **_):
+            return self._repo_status(repo)
+
+        @route("POST", gh + r"/orgs/(?P<org>[^/]+)/repos")
+        def github_create_repository(body, **_):
+            name = self._json(body)["name"]
+            self.remotes.create(name, with_main=False)
+            return 201, {"name": name}
+
+        @route("POST", gh + r"/graphql")
+        def github_graphql(body, **_):
+            query = self._json(body)["query"]
+            head = re.search(r'headRefName: "([^"]*)"', query)
+            data = {}
+            for alias, repo in re.findall(r'(r\d+): repository\(owner: "[^"]*", name: "([^"]*)"\)', query):
+                if not self.remotes.exists(repo):
+                    data[alias] = None
+                    continue
+                sha = self.remotes.head(repo)
+                pull_requests = self._pull_requests(repo, head.group(1) if head else "")
+                data[alias] = {
+                    "ref": {"target": {"oid": sha}} if sha else None,
+                    "pullRequests": {"nodes": [{"number": pull_request["number"]} for pull_request in pull_requests]},
+                }
+            return 200, {"data": data}
+
+        @route("GET", gh + r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/hooks")
+        def github_get_hooks(request, repo, query, **_):
+            return self._page(request, self.hooks.get(repo, []), query)
+
+        @route("POST", gh + r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/hooks")
+        def github_create_hook(repo, body, **_):
+            hook = dict(self._json(body), id=self._next_id())
+            self.hooks.setdefault(repo, []).append(hook)
+            return 201, hook
+
+        @route("PATCH", gh + r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/hooks/(?P<hook_id>\d+)")
+        def github_update_hook(repo, hook_id, body, **_):
+            for hook in self.hooks.get(repo, []):
+                if str(hook["id"]) == hook_id:
+                    hook.update(self._json(body))
+                    return 200, hook
+            return 404, {"message": "Not Found"}
+
+        @route("GET", gh + r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/pulls")
+        def github_list_pulls(repo, query, **_):
+            return 200, self._pull_requests(repo, query.get("head", "").split(":")[-1])
+
+        @route("POST", gh + r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/pulls")
+        def github_create_pull(org, repo, body, **_):
+            number = self._next_id()
+            return self._open_pull_request(repo, self._json(body)["head"], {
+                "number": number, "url": f"https://api.github.com/repos/{org}/{repo}/pulls/{number}",
+                "html_url": f"https://github.com/{org}/{repo}/pull/{number}",
+            })
+
+        @route("GET", gh + r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/git/ref/heads/(?P<branch>.+)")
+        def github_get_ref(repo, branch, **_):
+            sha = self.remotes.head(repo, branch) if self.remotes.exists(repo) else None
+            return (200, {"object": {"sha": sha}}) if sha else (404, {"message": "Not Found"})
+
+        @route("GET", gh + r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/contents/(?P<path>.+)")
+        def github_get_content(repo, path, query, **_):
+            return self._file(repo, unquote(path), query.get("ref", "main"))
+
+        @route("GET", gh + r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/git/commits/(?P<sha>\w+)")
+        def github_get_commit(sha, **_):
+            return 200, {"sha": sha, "tree": {"sha": f"tree-{sha}"}}
+
+        @route("POST", gh + r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/git/(?P<kind>trees|commits|refs)")
+        def github_create_git_object(kind, **_):
+            return 201, {"sha": f"{kind}-{self._next_id()}"}
+
+        @route("PATCH", gh + r"/repos/(?P<org>[^/]+)/(?P<repo>[^/]+)/git/refs/heads/(?P<branch>.+)")
+        def github_update_ref(body, **_):
+            return 200, {"object": {"sha": self._json(body)["sha"]}}
+
+        gl = "/gitlab.com/api/v4"
+
+        @route("GET", gl + r"/groups/(?P<group>[^/]+)")
+        def gitlab_get_group(group, **_):
+            found = self.gitlab_groups.get(unquote(group))
+            return (200, found) if found else (404, {"message": "404 Group Not Found"})
+
+        @route("GET", gl + r"/groups")
+        def gitlab_search_groups(query, **_):
+            groups = [group for group in self.gitlab_groups.values() if query.get("search", "") in group["name"]]
+            per_page, page = int(query.get("per_page", 20)), int(query.get("page", 1))
+            headers = {"X-Next-Page": str(page + 1) if page * per_page < len(groups) else ""}
+            return 200, groups[(page - 1) * per_page:page * per_page], headers
+
+        @route("GET", gl + r"/projects/(?P<project>[^/]+)")
+        def gitlab_get_project(project, **_):
+            name = unquote(project).split("/")[-1]
+            if not self.remotes.exists(name):
+                return 404, {"message": "404 Project Not Found"}
+            return 200, self._gitlab_project(unquote(project))
+
+        @route("POST", gl + r"/projects")
+        def gitlab_create_project(body, **_):
+            data = self._json(body)
+            self.remotes.create(data["name"], with_main=True)
+            return 201, self._gitlab_project(f"group/{data['name']}")
+
+        @route("POST", gl + r"/projects/(?P<project_id>\d+)/triggers")
+        def gitlab_create_trigger(project_id, body, **_):
+            trigger = {"id": self._next_id(), "token": "trigger-token", "description": self._json(body)["description"]}
+            with self._lock:
+                self.triggers.setdefault(project_id, []).append(trigger)
+            return 201, trigger
+
+        @route("GET", gl + r"/projects/(?P<project_id>\d+)/triggers")
+        def gitlab_list_triggers(project_id, **_):
+            return 200, self.triggers.get(project_id, [])
+
+        @route("GET", gl + r"/projects/(?P<project_id>\d+)/merge_requests")
+        def gitlab_list_merge_requests(project_id, query, **_):
+            return 200, self._pull_requests(project_id, query.get("source_branch", ""))
+
+        @route("POST", gl + r"/projects/(?P<project_id>\d+)/merge_requests")
+        def gitlab_create_merge_request(project_id, body, **_):
+            iid = self._next_id()
+            return self._open_pull_request(project_id, self._json(body)["source_branch"], {
+                "iid": iid, "web_url": f"https://gitlab.com/{self.project_names[int(project_id)]}/-/merge_requests/{iid}",
+            })
+
+        @route("GET", gl + r"/projects/(?P<project_id>\d+)/repository/branches/(?P<branch>[^/]+)")
+        def gitlab_get_branch(project_id, branch, **_):
+            sha = self.remotes.head(self.project_names[int(project_id)].split("/")[-1], unquote(branch))
+            return (200, {"commit": {"id": sha}}) if sha else (404, {"message": "404 Branch Not Found"})
+
+        @route("GET", gl + r"/projects/(?P<project_id>\d+)/repository/files/(?P<path>[^/]+)/raw")
+        def gitlab_get_file(project_id, path, query, **_):
+            return self._file(self.project_names[int(project_id)].split("/")[-1], unquote(path), query.get("ref", "main"))
+
+        @route("POST", gl + r"/projects/(?P<project_id>\d+)/repository/commits")
+        def gitlab_create_commit(**_):
+            return 201, {"id": f"commit-{self._next_id()}"}
+
+        az = "/dev.azure.com"
+
+        @route("GET", az + r"/(?P<org>[^/]+)/_apis/projects/(?P<project>[^/]+)")
+        def azure_get_project(project, **_):
+            return (200, {"id": f"project-{project}", "name": project}) if project in self.azure_projects else (404, {})
+
+        @route("POST", az + r"/(?P<org>[^/]+)/_apis/projects/(?P<project>[^/]+)")
+        def azure_create_project(org, project, **_):
+            self.azure_projects.add(project)
+            operation = self._next_id()
+            return 202, {"id": operation, "status": "queued", "url": f"https://dev.azure.com/{org}/_apis/operations/{operation}"}
+
+        @route("GET", az + r"/(?P<org>[^/]+)/_apis/operations/(?P<operation>[^/]+)")
+        def azure_get_operation(**_):
+            return 200, {"status": "succeeded"}
+
+        @route("GET", az + r"/(?P<org>[^/]+)/(?P<project>[^/]+)/_apis/git/repositories/(?P<repo>[^/]+)")
+        def azure_get_repository(repo, **_):
+            return self._repo_status(repo)
+
+        @route("GET", az + r"/(?P<org>[^/]+)/(?P<project>[^/]+)/_apis/git/repositories")
+        def azure_list_repositories(**_):
+            return 200, {"value": [{"id": path.stem, "name": path.stem} for path in self.remotes.root.glob("*.git")]}
+
+        @route("POST", az + r"/(?P<org>[^/]+)/_apis/git/repositories")
+        def azure_create_repository(body, **_):
+            name = self._json(body)["name"]
+            self.remotes.create(name, with_main=False)
+            return 201, {"id": name, "name": name}
+
+        @route("GET", az + r"/(?P<org>[^/]+)/(?P<project>[^/]+)/_apis/git/repositories/(?P<repo>[^/]+)/refs")
+        def azure_get_refs(repo, query, **_):
+            branch = query.get("filter", "heads/main").split("/", 1)[-1]
+            sha = self.remotes.head(repo, branch)
+            return 200, {"value": [{"name": f"refs/heads/{branch}", "objectId": sha}] if sha else []}
+
+        @route("GET", az + r"/(?P<org>[^/]+)/(?P<project>[^/]+)/_apis/git/repositories/(?P<repo>[^/]+)/items")
+        def azure_get_item(repo, query, **_):
+            return self._file(repo, query.get("path", "").lstrip("/"), query.get("versionDescriptor.version", "main"))
+
+        @route("POST", az + r"/(?P<org>[^/]+)/(?P<project>[^/]+)/_apis/git/repositories/(?P<repo>[^/]+)/pushes")
+        def azure_create_push(**_):
+            return 201, {"pushId": self._next_id()}
+
+        @route("GET", az + r"/(?P<org>[^/]+)/(?P<project>[^/]+)/_apis/git/repositories/(?P<repo>[^/]+)/pullrequests")
+        def azure_list_pull_requests(repo, query, **_):
+            branch = query.get("searchCriteria.sourceRefName", "").replace("refs/heads/", "", 1)
+            return 200, {"value": self._pull_requests(repo, branch)}
+
+        @route("POST", az + r"/(?P<org>[^/]+)/(?P<project>[^/]+)/_apis/git/repositories/(?P<repo>[^/]+)/pullrequests")
+        def azure_create_pull_request(repo, body, **_):
+            branch = self._json(body)["sourceRefName"].replace("refs/heads/", "", 1)
+            return self._open_pull_request(repo, branch, {"pullRequestId": self._next_id(), "repository": {"name": repo}})
+
+        @route("GET", az + r"/(?P<org>[^/]+)/(?P<project>[^/]+)/_apis/git/pullrequests")
+        def azure_list_project_pull_requests(query, **_):
+            branch = query.get("searchCriteria.sourceRefName", "").replace("refs/heads/", "", 1)
+            with self._lock:
+                pull_requests = [pr for (_, pr_branch), pr in self.pull_requests.items() if pr_branch == branch]
+            return 200, {"value": pull_requests}
+
+        @route("GET", az + r"/(?P<org>[^/]+)/(?P<project>[^/]+)/_apis/pipelines")
+        def azure_list_pipelines(**_):
+            return 200, {"value": []}
+
+        @route("POST", az + r"/(?P<org>[^/]+)/(?P<project>[^/]+)/_apis/pipelines")
+        def azure_create_pipeline(**_):
+            return 200, {"id": self._next_id()}
+
+        @route("POST", r"/bitbucket.org/site/oauth2/access_token")
+        def bitbucket_auth(**_):
+            return 200, {"access_token": BITBUCKET_ACCESS_TOKEN}
+
+        bb = "/api.bitbucket.org/2.0"
+
+        @route("GET", bb + r"/repositories/(?P<ws>[^/]+)/(?P<repo>[^/]+)")
+        def bitbucket_get_repository(repo, **_):
+            return self._repo_status(repo)
+
+        @route("POST", bb + r"/repositories/(?P<ws>[^/]+)/(?P<repo>[^/]+)")
+        def bitbucket_create_repository(repo, **_):
+            self.remotes.create(repo, with_main=False)
+            return 200, {"name": repo}
+
+        @route("GET", bb + r"/workspaces/(?P<ws>[^/]+)/projects/(?P<key>[^/]+)")
+        def bitbucket_get_project(key, **_):
+            return 200, {"key": key}
+
+        @route("GET", bb + r"/workspaces/(?P<ws>[^/]+)/projects")
+        def bitbucket_list_projects(**_):
+            return 200, {"values": [{"key": key, "name": key} for key in sorted(self.bitbucket_projects)]}
+
+        @route("GET", bb + r"/repositories/(?P<ws>[^/]+)/(?P<repo>[^/]+)/refs/branches/(?P<branch>[^/]+)")
+        def bitbucket_get_branch(repo, branch, **_):
+            sha = self.remotes.head(repo, branch) if self.remotes.exists(repo) else None
+            return (200, {"target": {"hash": sha}}) if sha else (404, {})
+
+        @route("GET", bb + r"/repositories/(?P<ws>[^/]+)/(?P<repo>[^/]+)/src/(?P<ref>[^/]+)/(?P<path>.+)")
+        def bitbucket_get_source(repo, ref, path, **_):
+            return self._file(repo, path, ref)
+
+        @route("POST", bb + r"/repositories/(?P<ws>[^/]+)/(?P<repo>[^/]+)/src")
+        def bitbucket_create_commit(**_):
+            return 201, {}
+
+        @route("GET", bb + r"/repositories/(?P<ws>[^/]+)/(?P<repo>[^/]+)/pullrequests")
+        def bitbucket_list_pull_requests(repo, query, **_):
+            branch = re.search(r'source.branch.name="([^"]*)"', query.get("q", ""))
+            return 200, {"values": self._pull_requests(repo, branch.group(1) if branch else "")}
+
+        @route("POST", bb + r"/repositories/(?P<ws>[^/]+)/(?P<repo>[^/]+)/pullrequests")
+        def bitbucket_create_pull_request(ws, repo, body, **_):
+            number = self._next_id()
+            return self._open_pull_request(repo, self._json(body)["source"]["branch"]["name"], {
+                "id": number, "links": {"html": {"href": f"https://bitbucket.org/{ws}/{repo}/pull-requests/{number}"}},
+            })
+
+        @route("GET", bb + r"/repositories/(?P<ws>[^/]+)/(?P<repo>[^/]+)/pipelines_config")
+        def bitbucket_get_pipeline(repo, **_):
+            return 200, {"enabled": repo in self.bitbucket_pipelines}
+
+        @route("PUT", bb + r"/repositories/(?P<ws>[^/]+)/(?P<repo>[^/]+)/pipelines_config")
+        def bitbucket_update_pipeline(repo, **_):
+            with self._lock:
+                self.bitbucket_pipelines.add(repo)
+            return 200, {"enabled": True}
+
+    def _gitlab_project(self, full_path: str) -> dict:
+        with self._lock:
+            project_id = self.projects.setdefault(full_path, len(self.projects) + 1)
+            self.project_names[project_id] = full_path
+        return {"id": project_id, "http_url_to_repo": f"https://gitlab.com/{full_path}.git"}
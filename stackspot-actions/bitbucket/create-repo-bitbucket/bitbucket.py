@@ -1,10 +1,13 @@
 import json
 import requests
 import logging
-from typing import Any
+from typing import Any, Dict, Optional
 
 logger = logging.getLogger()
 
+PAGE_SIZE = 100
+MAX_KEY_CONFLICTS = 5
+
 
 class BitbucketCreateRepository:
 
@@ -14,6 +17,8 @@ class BitbucketCreateRepository:
         self.post_headers = {"Content-Type": "application/json"}
         self.post_headers.update(self.get_headers)
         self.workspace_name = org
+        # Projects of the workspace by key, listed once and reused by every repository created with this instance
+        self.projects: Optional[Dict[str, dict]] = None
 
     def __call__(self, project_name: str, name: str, visibility: str = "PRIVATE") -> Any:
         self.workspace_exists()
@@ -40,47 +45,71 @@ class BitbucketCreateRepository:
             return False
         response.raise_for_status()
 
+    def list_projects(self) -> Dict[str, dict]:
+        if self.projects is None:
+            logger.info(f"Listing the projects of the workspace {self.workspace_name} ...")
+            projects = {}
+            url = f"{self.base_url}/workspaces/{self.workspace_name}/projects"
+            params = dict(pagelen=PAGE_SIZE)
+            while url:
+                response = requests.get(url, headers=self.get_headers, params=params)
+                if response.status_code == requests.codes.not_found:
+                    break
+                response.raise_for_status()
+                data = response.json()
+                projects.update({project["key"]: project for project in data.get("values", [])})
+                # The next page url already carries the query parameters
+                url, params = data.get("next"), None
+            self.projects = projects
+        return self.projects
+
     def get_project_key(self, project_name: str):
         logger.info(f"Checking if the '{project_name}' project exists in the workspace {self.workspace_name} ...")
-        url = f"{self.base_url}/workspaces/{self.workspace_name}/projects"
-        response = requests.get(url, self.get_headers)
-        if response.ok:
-            data = response.json()
-            values = data.get("values", [])
-            project_exists = [val for val in values if val.get("key") == project_name or val.get("name") == project_name]
-            if project_exists:
+        for key, project in self.list_projects().items():
+            if key == project_name or project.get("name") == project_name:
                 logger.info(f"Project '{project_name}' project found in the workspace {self.workspace_name}.")
-                project = project_exists.pop()
-                return project.get("key")
-        if response.status_code == requests.codes.not_found:
-            return None
-        response.raise_for_status()
-
-    def project_key_exists(self, key: str):
-        logger.info(f"Checking if the '{key}' exists.")
-        url = f"{self.base_url}/workspaces/{self.workspace_name}/projects/{key}"
-        response = requests.get(url, self.get_headers)
-        if response.ok:
-            return True
-        elif response.status_code == requests.codes.not_found:
-            return False
-        response.raise_for_status()
+                return key
+        return None
 
-    def create_project(self, project_name: str):
-        logger.info(f"Creating project '{project_name}' in the workspace {self.workspace_name} ...")
+    def next_free_key(self, project_name: str) -> str:
         k = project_name.replace(" ", "").replace("_", "").replace("-", "").upper()
-
+        existing = {key.upper() for key in self.list_projects()}
         key = k
         i = 0
-        while not self.project_key_exists(key):
+        while key in existing:
             i += 1
             key = f"{k}{i}"
+        return key
 
-        logger.info(f"Project key set to {key}")
+    @staticmethod
+    def key_conflict(response: requests.Response, key: str) -> bool:
+        # A taken name is answered with the same 400, only an error about the key is worth another key
+        if response.status_code == requests.codes.conflict:
+            return True
+        if response.status_code != requests.codes.bad_request:
+            return False
+        try:
+            error = response.json().get("error") or {}
+        except ValueError:
+            return False
+        return "key" in (error.get("fields") or {}) or key in (error.get("message") or "")
+
+    def create_project(self, project_name: str):
+        logger.info(f"Creating project '{project_name}' in the workspace {self.workspace_name} ...")
         url = f"{self.base_url}/workspaces/{self.workspace_name}/projects"
-        response = requests.post(url, headers=self.post_headers, data=json.dumps(dict(name=project_name, key=key)))
+        for _ in range(MAX_KEY_CONFLICTS):
+            key = self.next_free_key(project_name=project_name)
+            logger.info(f"Project key set to {key}")
+            response = requests.post(url, headers=self.post_headers, data=json.dumps(dict(name=project_name, key=key)))
+            if self.key_conflict(response, key):
+                # Taken after the listing, by someone else creating projects in the same workspace
+                logger.info(f"Project key {key} is already taken, trying the next one ...")
+                self.projects[key] = dict(key=key)
+                continue
+            response.raise_for_status()
+            self.projects[key] = response.json()
+            return key
         response.raise_for_status()
-        return key
 
     def create_repository(self, project_key: str, repo_name: str, visibility: str):
         logger.info(f"Creating repository '{repo_name}' in the project {project_key} ...")
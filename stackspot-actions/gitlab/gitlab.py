@@ -1,9 +1,14 @@
+import time
 import requests
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote
 
 logger = logging.getLogger()
 
+PAGE_SIZE = 100
+GROUP_CACHE_TTL = 600
+
 
 class GroupNotFound(Exception):
     def __init__(self, group_name: str):
@@ -18,6 +23,8 @@ class GitlabCreateRepository:
             'path': ['has already been taken']
         }
     }
+    # (gitlab url, group name) -> (expiration, group), shared by every repository created in the same process
+    groups: Dict[Tuple[str, str], Tuple[float, Dict]] = {}
 
     def __init__(self, token: str, **_) -> None:
         self.base_url = "https://gitlab.com"
@@ -32,14 +39,34 @@ class GitlabCreateRepository:
         return repository.get("http_url_to_repo", f"https://gitlab.com/{group['path']}/{name}.git")
 
     def get_group(self, group_name: str) -> Optional[Dict]:
+        key = (self.base_url, group_name)
+        cached = self.groups.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        group = self.find_group(group_name)
+        if group:
+            self.groups[key] = (time.monotonic() + GROUP_CACHE_TTL, group)
+        return group
+
+    def find_group(self, group_name: str) -> Optional[Dict]:
         logger.info(f"Getting group '{group_name}' ...")
+        # The full path resolves directly, a display name needs a search
+        response = requests.get(f"{self.base_url}/api/v4/groups/{quote(group_name, safe='')}", headers=self.headers)
+        if response.ok:
+            return response.json()
+        if response.status_code != requests.codes.not_found:
+            response.raise_for_status()
+
         url = f"{self.base_url}/api/v4/groups"
-        response = requests.get(url, headers=self.headers, params=dict(search=group_name))
-        response.raise_for_status()
-        groups = response.json()
-        for group in groups:
-            if group['name'] == group_name:
-                return group
+        page = "1"
+        while page:
+            params = dict(search=group_name.rsplit("/", 1)[-1], per_page=PAGE_SIZE, page=page)
+            response = requests.get(url, headers=self.headers, params=params)
+            response.raise_for_status()
+            for group in response.json():
+                if group_name in (group.get('full_path'), group['name']):
+                    return group
+            page = response.headers.get("X-Next-Page")
 
     def create_project(self, **data) -> Optional[Dict]:
         logger.info(f"Creating project '{data.get('name')}' ...")
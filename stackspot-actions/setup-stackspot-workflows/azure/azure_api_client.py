@@ -1,6 +1,10 @@
 import base64
+from typing import List
+
 import requests
 
+from helpers.http_client import HttpClient
+
 CREATE_PROJECT_SERVICE_URL = "https://{domain}/{org_name}/_apis/projects/{project_name}"
 GET_PROJECT_SERVICE_URL = "https://{domain}/{org_name}/_apis/projects/{project_name}"
 CREATE_PULL_REQUEST_SERVICE_URL = "https://{domain}/{org_name}/{project_name}/_apis/git/repositories/{respository_name}/pullrequests"
@@ -8,12 +12,18 @@ CREATE_PIPELINE_SERVICE_URL = "https://{domain}/{org_name}/{project_name}/_apis/
 CREATE_REPOSITORY_SERVICE_URL = "https://{domain}/{org_name}/_apis/git/repositories"
 GET_REPOSITORY_ID_SERVICE_URL = "https://{domain}/{org_name}/{project_name}/_apis/git/repositories/{repository_name}"
 CREATE_SERVICE_ENDPOINT_SERVICE_URL = "https://{domain}/{org_name}/{project_name}/_apis/serviceendpoint/endpoints"
+GET_REFS_SERVICE_URL = "https://{domain}/{org_name}/{project_name}/_apis/git/repositories/{repository_name}/refs"
+GET_ITEM_SERVICE_URL = "https://{domain}/{org_name}/{project_name}/_apis/git/repositories/{repository_name}/items"
+CREATE_PUSH_SERVICE_URL = "https://{domain}/{org_name}/{project_name}/_apis/git/repositories/{repository_name}/pushes"
+LIST_REPOSITORIES_SERVICE_URL = "https://{domain}/{org_name}/{project_name}/_apis/git/repositories"
+LIST_PIPELINES_SERVICE_URL = "https://{domain}/{org_name}/{project_name}/_apis/pipelines"
+LIST_PROJECT_PULL_REQUESTS_SERVICE_URL = "https://{domain}/{org_name}/{project_name}/_apis/git/pullrequests"
 UPDATE_PIPELINE_PERMISSION_ENDPOINT_SERVICE_URL = "https://{domain}/{org_name}/{project_name}/_apis/pipelines/pipelinePermissions/endpoint/{endpoint_id}"
 
 
 class AzureApiClient:
     def __init__(self, **kwargs):
-        self.http_client = kwargs.get("http_client")
+        self.http_client = kwargs.get("http_client") or HttpClient.default()
         self.pat = kwargs.get("pat")
         self.api_version = {"api-version": "7.0"}
         self.authorization = {"Authorization": f'Basic {base64.b64encode(f"user:{self.pat}".encode()).decode("utf-8")}'}
@@ -39,6 +49,8 @@ class AzureApiClient:
             },
             title="azure create pipeline",
             raise_for_status=raise_for_status,
+            # A repeated creation answers 409, which callers already handle
+            idempotent=True,
         )
 
     def get_repository(self, org_name: str, project_name: str, repository_name: str, raise_for_status: bool = True) -> requests.Response:
@@ -48,6 +60,34 @@ class AzureApiClient:
             headers=self.authorization,
             title="azure get repository",
             raise_for_status=raise_for_status,
+            cacheable=True,
+        )
+
+    def list_repositories(self, org_name: str, project_name: str) -> requests.Response:
+        return self.http_client.get(
+            url=LIST_REPOSITORIES_SERVICE_URL.format(domain=self.domain, org_name=org_name, project_name=project_name),
+            params=self.api_version,
+            headers=self.authorization,
+            title="azure list repositories",
+            raise_for_status=True,
+        )
+
+    def list_pipelines(self, org_name: str, project_name: str) -> requests.Response:
+        return self.http_client.get(
+            url=LIST_PIPELINES_SERVICE_URL.format(domain=self.domain, org_name=org_name, project_name=project_name),
+            params=self.api_version,
+            headers=self.authorization,
+            title="azure list pipelines",
+            raise_for_status=True,
+        )
+
+    def list_project_pull_requests(self, org_name: str, project_name: str, pr_source: str) -> requests.Response:
+        return self.http_client.get(
+            url=LIST_PROJECT_PULL_REQUESTS_SERVICE_URL.format(domain=self.domain, org_name=org_name, project_name=project_name),
+            params={**self.api_version, "searchCriteria.sourceRefName": f"refs/heads/{pr_source}", "searchCriteria.status": "active"},
+            headers=self.authorization,
+            title="azure list project pull requests",
+            raise_for_status=True,
         )
 
     def get_project(self, org_name: str, project_name: str, raise_for_status: bool = True) -> requests.Response:
@@ -57,6 +97,7 @@ class AzureApiClient:
             headers=self.authorization,
             title="azure get project",
             raise_for_status=raise_for_status,
+            cacheable=True,
         )
 
     def create_project(self, org_name: str, project_name: str) -> requests.Response:
@@ -77,6 +118,19 @@ class AzureApiClient:
             },
             title="azure create project",
             raise_for_status=True,
+            retry_check=lambda: self._project_missing(org_name=org_name, project_name=project_name),
+        )
+
+    def _project_missing(self, org_name: str, project_name: str) -> bool:
+        return self.get_project(org_name=org_name, project_name=project_name, raise_for_status=False).status_code == 404
+
+    def get_operation(self, operation_url: str) -> requests.Response:
+        return self.http_client.get(
+            url=operation_url,
+            params=self.api_version,
+            headers=self.authorization,
+            title="azure get operation",
+            raise_for_status=True,
         )
 
     def create_repository(self, org_name: str, project_id: str, repository_name: str) -> requests.Response:
@@ -92,7 +146,14 @@ class AzureApiClient:
             },
             title="azure create repository",
             raise_for_status=True,
+            retry_check=lambda: self._repository_missing(org_name=org_name, project_id=project_id, repository_name=repository_name),
+        )
+
+    def _repository_missing(self, org_name: str, project_id: str, repository_name: str) -> bool:
+        response = self.get_repository(
+            org_name=org_name, project_name=project_id, repository_name=repository_name, raise_for_status=False
         )
+        return response.status_code == 404
 
     def create_service_endpoint(self, org_name: str, project_name: str, github_pat: str, project_id: str, raise_for_status: bool = True) -> requests.Response:
         return self.http_client.post(
@@ -136,6 +197,7 @@ class AzureApiClient:
             },
             title="azure update pipeline permission endpoint",
             raise_for_status=True,
+            idempotent=True,
         )
 
     def create_pull_request(self, org_name: str, respository_name: str, project_name: str, pr_title: str, pr_description: str, pr_target: str, pr_source: str) -> requests.Response:
@@ -151,4 +213,78 @@ class AzureApiClient:
             },
             title="azure create pull request",
             raise_for_status=True,
+            retry_check=lambda: self._pull_request_missing(
+                org_name=org_name, respository_name=respository_name, project_name=project_name, pr_source=pr_source
+            ),
+        )
+
+    def _pull_request_missing(self, org_name: str, respository_name: str, project_name: str, pr_source: str) -> bool:
+        return not self.list_active_pull_requests(
+            org_name=org_name, respository_name=respository_name, project_name=project_name, pr_source=pr_source
+        ).json().get("value")
+
+    def list_active_pull_requests(self, org_name: str, respository_name: str, project_name: str, pr_source: str) -> requests.Response:
+        return self.http_client.get(
+            url=CREATE_PULL_REQUEST_SERVICE_URL.format(domain=self.domain, org_name=org_name, project_name=project_name, respository_name=respository_name),
+            params={**self.api_version, "searchCriteria.sourceRefName": f"refs/heads/{pr_source}", "searchCriteria.status": "active"},
+            headers=self.authorization,
+            title="azure list pull requests",
+            raise_for_status=True,
+        )
+
+    def get_branch_refs(self, org_name: str, project_name: str, repository_name: str, branch: str) -> requests.Response:
+        return self.http_client.get(
+            url=GET_REFS_SERVICE_URL.format(domain=self.domain, org_name=org_name, project_name=project_name, repository_name=repository_name),
+            params={**self.api_version, "filter": f"heads/{branch}"},
+            headers=self.authorization,
+            title="azure get branch refs",
+            raise_for_status=True,
+        )
+
+    def get_item_content(self, org_name: str, project_name: str, repository_name: str, path: str, branch: str) -> requests.Response:
+        return self.http_client.get(
+            url=GET_ITEM_SERVICE_URL.format(domain=self.domain, org_name=org_name, project_name=project_name, repository_name=repository_name),
+            params={
+                **self.api_version,
+                "path": path,
+                "versionDescriptor.versionType": "branch",
+                "versionDescriptor.version": branch,
+                "$format": "octetStream",
+            },
+            headers=self.authorization,
+            title="azure get item",
+            raise_for_status=False,
+        )
+
+    def create_push(self, org_name: str, project_name: str, repository_name: str, branch: str, old_object_id: str, message: str, changes: List[dict]) -> requests.Response:
+        return self.http_client.post(
+            url=CREATE_PUSH_SERVICE_URL.format(domain=self.domain, org_name=org_name, project_name=project_name, repository_name=repository_name),
+            params=self.api_version,
+            headers=self.authorization,
+            json={
+                "refUpdates": [{"name": f"refs/heads/{branch}", "oldObjectId": old_object_id}],
+                "commits": [
+                    {
+                        "comment": message,
+                        "changes": [
+                            {
+                                "changeType": change["change_type"],
+                                "item": {"path": change["path"]},
+                                **(
+                                    {
+                                        "newContent": {
+                                            "content": base64.b64encode(change["content"]).decode(),
+                                            "contentType": "base64encoded",
+                                        }
+                                    }
+                                    if change["content"] is not None else {}
+                                ),
+                            }
+                            for change in changes
+                        ],
+                    }
+                ],
+            },
+            title="azure create push",
+            raise_for_status=True,
         )
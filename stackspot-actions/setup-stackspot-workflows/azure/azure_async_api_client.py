@@ -0,0 +1,22 @@
+from azure.azure_api_client import AzureApiClient
+from helpers.async_http_client import AsyncApiClient, AsyncHttpClient
+
+
+class AzureAsyncApiClient(AsyncApiClient, AzureApiClient):
+    def __init__(self, **kwargs):
+        super().__init__(**dict(kwargs, http_client=kwargs.get("http_client") or AsyncHttpClient.default()))
+
+    async def _project_missing(self, org_name: str, project_name: str) -> bool:
+        response = await self.get_project(org_name=org_name, project_name=project_name, raise_for_status=False)
+        return response.status_code == 404
+
+    async def _repository_missing(self, org_name: str, project_id: str, repository_name: str) -> bool:
+        response = await self.get_repository(
+            org_name=org_name, project_name=project_id, repository_name=repository_name, raise_for_status=False
+        )
+        return response.status_code == 404
+
+    async def _pull_request_missing(self, org_name: str, respository_name: str, project_name: str, pr_source: str) -> bool:
+        return not (await self.list_active_pull_requests(
+            org_name=org_name, respository_name=respository_name, project_name=project_name, pr_source=pr_source
+        )).json().get("value")
@@ -0,0 +1,160 @@
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from helpers.exceptions import ActionException, InvalidManifestException
+from plan import Plan, TargetPlan, plan_target
+from provider import Provider
+from scheduler import StageLimiter, default_cpu_limit, run_jobs
+from setup import SetupResult, setup
+
+# Inputs the api clients are built from, targets overriding any of them get their own client
+API_CLIENT_INPUTS = ("pat", "client_key", "client_secret", "gitlab_api_domain")
+
+
+@dataclass(frozen=True)
+class BatchManifest:
+    targets: List[dict]
+    options: dict
+
+
+@dataclass(frozen=True)
+class BatchEntry:
+    target: str
+    result: Optional[SetupResult] = None
+    error: Optional[str] = None
+
+
+def load_manifest(path: str) -> BatchManifest:
+    manifest_path = Path(path)
+    if not manifest_path.exists():
+        raise InvalidManifestException(f"Manifest {path} not found")
+    content = manifest_path.read_text()
+    if manifest_path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise InvalidManifestException("PyYAML is needed to read yaml manifests, use a json manifest instead")
+        data = yaml.safe_load(content)
+    else:
+        data = json.loads(content)
+
+    if isinstance(data, list):
+        data = dict(targets=data)
+    if not isinstance(data, dict) or not isinstance(data.get("targets"), list):
+        raise InvalidManifestException(f"Manifest {path} must have a list of targets")
+    targets = data.pop("targets")
+    if not all(isinstance(target, dict) for target in targets):
+        raise InvalidManifestException(f"Every target of manifest {path} must be an object")
+    return BatchManifest(targets=targets, options=data)
+
+
+def _error_message(e: Exception) -> str:
+    if isinstance(e, requests.HTTPError):
+        logging.error("A failure with a important request happened")
+        return f"HTTP failure: {e}"
+    if isinstance(e, ActionException):
+        logging.error(e.msg)
+        return e.msg
+    logging.exception(e)
+    return str(e)
+
+
+def run_target(
+    build_provider: Callable[[dict], Provider], target: dict, limiter: StageLimiter, plan: Optional[Plan] = None
+) -> BatchEntry:
+    provider = None
+    try:
+        provider = build_provider(target)
+        target_plan = plan.target_plan(provider.target_name, provider.inputs.ref_branch) if plan else None
+        return BatchEntry(target=provider.target_name, result=setup(provider, limiter, target_plan))
+    except Exception as e:
+        name = provider.target_name if provider else json.dumps(target)
+        return BatchEntry(target=name, error=_error_message(e))
+
+
+def provider_factory(provider_class, manifest: BatchManifest, **kwargs) -> Callable[[dict], Provider]:
+    # Api clients (and their auth tokens) are shared by the targets with the same credentials and host
+    clients: Dict[Tuple, Any] = dict()
+    lock = threading.Lock()
+
+    def build_provider(target: dict) -> Provider:
+        options = {**kwargs, **manifest.options, **target}
+        key = tuple(options.get(name) for name in API_CLIENT_INPUTS)
+        with lock:
+            provider = provider_class(**options, **({"api": clients[key]} if key in clients else {}))
+            clients.setdefault(key, provider.api)
+        return provider
+
+    return build_provider
+
+
+def stage_limiter(provider_class, manifest: BatchManifest) -> StageLimiter:
+    return StageLimiter(
+        io_limit=int(manifest.options.get("io_workers") or provider_class.MAX_IO_CONCURRENCY),
+        cpu_limit=int(manifest.options.get("cpu_workers") or default_cpu_limit()),
+    )
+
+
+def run_batch(provider_class, manifest: BatchManifest, plan: Optional[Plan] = None, **kwargs) -> List[BatchEntry]:
+    build_provider = provider_factory(provider_class, manifest, **kwargs)
+    limiter = stage_limiter(provider_class, manifest)
+
+    def job(index: int, target: dict) -> Callable[[], BatchEntry]:
+        def execute() -> BatchEntry:
+            logging.info(f"[{index}/{len(manifest.targets)}] Setting up {json.dumps(target)}")
+            return run_target(build_provider, target, limiter, plan)
+        return execute
+
+    workers = limiter.workers if manifest.options.get("concurrent", True) else 1
+    logging.info(f"Running {len(manifest.targets)} targets with {limiter.io_limit} io and {limiter.cpu_limit} cpu workers")
+    return run_jobs((job(index, target) for index, target in enumerate(manifest.targets, start=1)), workers=workers)
+
+
+def plan_batch(provider_class, manifest: BatchManifest, **kwargs) -> Plan:
+    build_provider = provider_factory(provider_class, manifest, **kwargs)
+    limiter = stage_limiter(provider_class, manifest)
+    providers: List[Provider] = []
+    plans: List[TargetPlan] = []
+    for target in manifest.targets:
+        try:
+            providers.append(build_provider(target))
+        except Exception as e:
+            plans.append(TargetPlan(target=json.dumps(target), error=_error_message(e)))
+    try:
+        # Batched reads first, each target only reads what they could not answer
+        provider_class.prefetch(providers)
+    except Exception as e:
+        logging.info(f"Batched reads failed ({_error_message(e)}), every target is read on its own.")
+
+    def job(provider: Provider) -> Callable[[], TargetPlan]:
+        def execute() -> TargetPlan:
+            try:
+                return plan_target(provider)
+            except Exception as e:
+                return TargetPlan(target=provider.target_name, error=_error_message(e))
+        return execute
+
+    workers = limiter.io_limit if manifest.options.get("concurrent", True) else 1
+    logging.info(f"Planning {len(manifest.targets)} targets with {workers} workers")
+    plans += run_jobs((job(provider) for provider in providers), workers=workers)
+    return Plan(provider=kwargs.get("provider"), ref_branch=kwargs.get("ref_branch"), targets=plans)
+
+
+def log_summary(entries: List[BatchEntry]):
+    succeeded = [entry for entry in entries if entry.result]
+    failed = [entry for entry in entries if entry.error]
+    logging.info("...")
+    logging.info(f"Batch concluded: {len(succeeded)} succeeded, {len(failed)} failed.")
+    for entry in succeeded:
+        logging.info(f"[OK] {entry.target}")
+        logging.info(f"     scm config url: {entry.result.scm_config_url}")
+        entry.result.pr_link and logging.info(f"     pr: {entry.result.pr_link}")
+    for entry in failed:
+        logging.info(f"[FAILED] {entry.target}: {entry.error}")
+    logging.info("...")
@@ -1,6 +1,9 @@
 import requests
 import logging
+import threading
+from typing import Dict, List
 
+from helpers.http_client import HttpClient
 
 AUTH_SERVICE_URL = "https://bitbucket.org/site/oauth2/access_token"
 GET_REPOSITORY_SERVICE_URL = "https://{domain}/2.0/repositories/{workspace_name}/{repository_name}"
@@ -8,41 +11,55 @@ GET_PROJECTS_SERVICE_URL = "https://{domain}/2.0/workspaces/{workspace_name}/pro
 CREATE_REPOSITORY_SERVICE_URL = "https://{domain}/2.0/repositories/{workspace_name}/{repository_name}"
 CREATE_PULL_REQUEST_SERVICE_URL = "https://{domain}/2.0/repositories/{workspace_name}/{repository_name}/pullrequests"
 GET_REPOSITORY_VARIABLE_SERVICE_URL = "https://{domain}/2.0/repositories/{workspace_name}/{repository_name}/pipelines_config/variables"
+GET_BRANCH_SERVICE_URL = "https://{domain}/2.0/repositories/{workspace_name}/{repository_name}/refs/branches/{branch}"
+GET_SOURCE_FILE_SERVICE_URL = "https://{domain}/2.0/repositories/{workspace_name}/{repository_name}/src/{ref}/{path}"
+CREATE_SOURCE_COMMIT_SERVICE_URL = "https://{domain}/2.0/repositories/{workspace_name}/{repository_name}/src"
 PUT_REPOSITORY_PIPELINE_SERVICE_URL = "https://{domain}/2.0/repositories/{workspace_name}/{repository_name}/pipelines_config"
 
 
 class BitbucketApiClient:
     def __init__(self, **kwargs):
-        self.http_client = kwargs.get("http_client")
+        self.http_client = kwargs.get("http_client") or HttpClient.default()
         self.domain = "api.bitbucket.org"
         self.client_key = kwargs.get("client_key")
         self.client_secret = kwargs.get("client_secret")
         self.auth = (self.client_key, self.client_secret)
         self.authorization = None
+        self._authorization_lock = threading.Lock()
         self.headers = {
             "Accept": "application/json",
             "Content-Type": "application/json"
         }
 
+    def request_access_token(self) -> requests.Response:
+        return self.http_client.post(
+            url=AUTH_SERVICE_URL.format(domain=self.domain),
+            data=dict(grant_type="client_credentials"),
+            auth=self.auth,
+            title="bitbucket authentication",
+            raise_for_status=True,
+            idempotent=True,
+        )
+
+    @property
+    def access_token(self) -> str:
+        with self._authorization_lock:
+            if not self.authorization:
+                self.authorization = self.request_access_token().json()['access_token']
+        return self.authorization
+
     @property
     def authorization_header(self):
-        if not self.authorization:
-            result = self.http_client.post(
-                url=AUTH_SERVICE_URL.format(domain=self.domain),
-                data=dict(grant_type="client_credentials"),
-                auth=self.auth,
-                title="bitbucket authentication",
-                raise_for_status=True
-            )
-            self.authorization = result.json()['access_token']
-        return {"Authorization": f"Bearer {self.authorization}"}
+        return {"Authorization": f"Bearer {self.access_token}"}
 
     def get_repository(self, workspace_name: str, repository_name: str, raise_for_status: bool = True) -> requests.Response:
         return self.http_client.get(
             url=GET_REPOSITORY_SERVICE_URL.format(domain=self.domain, workspace_name=workspace_name, repository_name=repository_name),
             headers=dict(**self.authorization_header),
             title="bitbucket get repository",
-            raise_for_status=raise_for_status
+            raise_for_status=raise_for_status,
+            cacheable=True,
+            cache_scope=self.client_key,
         )
 
     def create_pull_request(self, workspace_name: str, repository_name: str, pr_title: str, pr_source: str, pr_destination: str) -> requests.Response:
@@ -55,7 +72,24 @@ class BitbucketApiClient:
                 "destination": {"branch": {"name": pr_destination}},
             },
             title="bitbucket create pull request",
-            raise_for_status=True
+            raise_for_status=True,
+            retry_check=lambda: self._pull_request_missing(
+                workspace_name=workspace_name, repository_name=repository_name, pr_source=pr_source
+            ),
+        )
+
+    def _pull_request_missing(self, workspace_name: str, repository_name: str, pr_source: str) -> bool:
+        return not self.list_open_pull_requests(
+            workspace_name=workspace_name, repository_name=repository_name, pr_source=pr_source
+        ).json().get("values")
+
+    def list_open_pull_requests(self, workspace_name: str, repository_name: str, pr_source: str) -> requests.Response:
+        return self.http_client.get(
+            url=CREATE_PULL_REQUEST_SERVICE_URL.format(domain=self.domain, workspace_name=workspace_name, repository_name=repository_name),
+            headers=dict(**self.authorization_header),
+            params=dict(q=f'source.branch.name="{pr_source}" AND state="OPEN"'),
+            title="bitbucket list pull requests",
+            raise_for_status=True,
         )
 
     def create_repository(self, workspace_name: str, repository_name: str, project_key: str):
@@ -68,15 +102,22 @@ class BitbucketApiClient:
                 "project": {"key": project_key},
             },
             title="bitbucket create repository",
-            raise_for_status=True
+            raise_for_status=True,
+            retry_check=lambda: self._repository_missing(workspace_name=workspace_name, repository_name=repository_name),
         )
 
+    def _repository_missing(self, workspace_name: str, repository_name: str) -> bool:
+        response = self.get_repository(workspace_name=workspace_name, repository_name=repository_name, raise_for_status=False)
+        return response.status_code == 404
+
     def get_projects(self, workspace_name: str, project_name: str):
         return self.http_client.get(
             url=GET_PROJECTS_SERVICE_URL.format(domain=self.domain, workspace_name=workspace_name, project_name=project_name),
             headers=dict(**self.authorization_header),
             title="bitbucket get project",
             raise_for_status=True,
+            cacheable=True,
+            cache_scope=self.client_key,
         )
 
     def update_repository_pipeline(self, workspace_name: str, repository_name: str):
@@ -87,3 +128,38 @@ class BitbucketApiClient:
             title="bitbucket update repository pypeline",
             raise_for_status=True,
         )
+
+    def get_repository_pipeline(self, workspace_name: str, repository_name: str) -> requests.Response:
+        return self.http_client.get(
+            url=PUT_REPOSITORY_PIPELINE_SERVICE_URL.format(domain=self.domain, workspace_name=workspace_name, repository_name=repository_name),
+            headers=dict(**self.authorization_header),
+            title="bitbucket get repository pipeline",
+            raise_for_status=False,
+        )
+
+    def get_branch(self, workspace_name: str, repository_name: str, branch: str) -> requests.Response:
+        return self.http_client.get(
+            url=GET_BRANCH_SERVICE_URL.format(domain=self.domain, workspace_name=workspace_name, repository_name=repository_name, branch=branch),
+            headers=dict(**self.authorization_header),
+            title="bitbucket get branch",
+            raise_for_status=False,
+        )
+
+    def get_source_file(self, workspace_name: str, repository_name: str, ref: str, path: str) -> requests.Response:
+        return self.http_client.get(
+            url=GET_SOURCE_FILE_SERVICE_URL.format(domain=self.domain, workspace_name=workspace_name, repository_name=repository_name, ref=ref, path=path),
+            headers=dict(**self.authorization_header),
+            title="bitbucket get source file",
+            raise_for_status=False,
+        )
+
+    def create_source_commit(self, workspace_name: str, repository_name: str, branch: str, parent: str, message: str, files: Dict[str, bytes], deleted: List[str] = ()) -> requests.Response:
+        return self.http_client.post(
+            url=CREATE_SOURCE_COMMIT_SERVICE_URL.format(domain=self.domain, workspace_name=workspace_name, repository_name=repository_name),
+            headers=dict(**self.authorization_header),
+            # Paths sent in the files field without content are removed
+            data=dict(message=message, branch=branch, parents=parent, **({"files": list(deleted)} if deleted else {})),
+            files={path: (path, content) for path, content in files.items()},
+            title="bitbucket create commit",
+            raise_for_status=True,
+        )
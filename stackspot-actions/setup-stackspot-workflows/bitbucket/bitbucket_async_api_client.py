@@ -0,0 +1,31 @@
+import asyncio
+
+from bitbucket.bitbucket_api_client import BitbucketApiClient
+from helpers.async_http_client import AsyncApiClient, AsyncHttpClient
+
+
+class BitbucketAsyncApiClient(AsyncApiClient, BitbucketApiClient):
+    def __init__(self, **kwargs):
+        super().__init__(**dict(kwargs, http_client=kwargs.get("http_client") or AsyncHttpClient.default()))
+        self._authentication_lock = asyncio.Lock()
+
+    async def authenticate(self):
+        async with self._authentication_lock:
+            if not self.authorization:
+                self.authorization = (await self.request_access_token()).json()['access_token']
+
+    @property
+    def authorization_header(self):
+        # Headers are built before the request is awaited, the token must already be there
+        if not self.authorization:
+            raise RuntimeError("Authenticate the bitbucket async client first: 'async with client' or 'await client.authenticate()'")
+        return {"Authorization": f"Bearer {self.authorization}"}
+
+    async def _pull_request_missing(self, workspace_name: str, repository_name: str, pr_source: str) -> bool:
+        return not (await self.list_open_pull_requests(
+            workspace_name=workspace_name, repository_name=repository_name, pr_source=pr_source
+        )).json().get("values")
+
+    async def _repository_missing(self, workspace_name: str, repository_name: str) -> bool:
+        response = await self.get_repository(workspace_name=workspace_name, repository_name=repository_name, raise_for_status=False)
+        return response.status_code == 404
@@ -1,16 +1,41 @@
+import json
 import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
 import requests
 
+from helpers.http_client import HttpClient
+
 GET_REPOSITORY_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}"
 CREATE_REPOSITORY_SERVICE_URL = "https://{domain}/orgs/{org_name}/repos"
 CREATE_PULL_REQUEST_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/pulls"
+LIST_PULL_REQUESTS_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/pulls"
+PULL_REQUEST_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/pulls/{number}"
 GET_REPOSITORY_HOOKS_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/hooks"
 CREATE_REPOSITORY_HOOKS_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/hooks"
+UPDATE_REPOSITORY_HOOK_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/hooks/{hook_id}"
+GET_BRANCH_REF_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/git/ref/heads/{branch}"
+GET_CONTENT_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/contents/{path}"
+GET_COMMIT_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/git/commits/{sha}"
+CREATE_TREE_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/git/trees"
+CREATE_COMMIT_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/git/commits"
+CREATE_REF_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/git/refs"
+UPDATE_REF_SERVICE_URL = "https://{domain}/repos/{org_name}/{repo_name}/git/refs/heads/{branch}"
+GRAPHQL_SERVICE_URL = "https://{domain}/graphql"
+
+PAGE_SIZE = 100
+HOOK_EVENTS = ["workflow_job", "workflow_run"]
+# Repositories read by one graphql query, keeps each query well below the node limit
+GRAPHQL_BATCH_SIZE = 50
+REPOSITORY_FIELDS = (
+    'ref(qualifiedName: "refs/heads/main") {{ target {{ oid }} }} '
+    "pullRequests(headRefName: {head}, states: OPEN, first: 1) {{ nodes {{ number }} }}"
+)
 
 
 class GithubApiClient:
     def __init__(self, **kwargs):
-        self.http_client = kwargs.get("http_client")
+        self.http_client = kwargs.get("http_client") or HttpClient.default()
         self.pat = kwargs.get("pat")
         self.domain = "api.github.com"
         self.headers = {
@@ -25,6 +50,7 @@ class GithubApiClient:
             headers=self.headers,
             title="github get repository",
             raise_for_status=raise_for_status,
+            cacheable=True,
         )
 
     def create_repository(self, org_name: str, repo_name: str) -> requests.Response:
@@ -40,36 +66,63 @@ class GithubApiClient:
             },
             title="github create repository",
             raise_for_status=True,
+            retry_check=lambda: self._repository_missing(org_name=org_name, repo_name=repo_name),
         )
 
-    def get_repository_hooks(self, org_name: str, repo_name: str) -> requests.Response:
-        logging.info("Github get repository hooks...")
-        return self.http_client.get(
+    def _repository_missing(self, org_name: str, repo_name: str) -> bool:
+        return self.get_repository(org_name=org_name, repo_name=repo_name, raise_for_status=False).status_code == 404
+
+    def iter_repository_hooks(self, org_name: str, repo_name: str) -> Iterator[dict]:
+        logging.info("Github list repository hooks...")
+        for response in self.http_client.get_pages(
             url=GET_REPOSITORY_HOOKS_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name),
             headers=self.headers,
+            params=dict(per_page=PAGE_SIZE),
             title="github get repository hooks",
             raise_for_status=True,
-        )
+            cacheable=True,
+        ):
+            yield from response.json()
+
+    @staticmethod
+    def _hook_body(callback_url: str) -> dict:
+        return {
+            "name": "web",
+            "active": True,
+            "events": HOOK_EVENTS,
+            "config": {
+                "url": callback_url,
+                "content_type": "json",
+                "insecure_ssl": "0",
+            },
+        }
 
     def create_repository_hook(self, org_name: str, repo_name: str, callback_url: str) -> requests.Response:
         logging.info("Github create repository hooks...")
         return self.http_client.post(
             url=CREATE_REPOSITORY_HOOKS_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name),
             headers=self.headers,
-            json={
-                "name": "web",
-                "active": True,
-                "events": ["workflow_job", "workflow_run"],
-                "config": {
-                    "url": callback_url,
-                    "content_type": "json",
-                    "insecure_ssl": "0",
-                },
-            },
+            json=self._hook_body(callback_url),
             title="github create repository hook",
             raise_for_status=True,
+            retry_check=lambda: self._hook_missing(org_name=org_name, repo_name=repo_name, callback_url=callback_url),
+        )
+
+    def update_repository_hook(self, org_name: str, repo_name: str, hook_id: int, callback_url: str) -> requests.Response:
+        logging.info("Github update repository hook...")
+        return self.http_client.patch(
+            url=UPDATE_REPOSITORY_HOOK_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name, hook_id=hook_id),
+            headers=self.headers,
+            json=self._hook_body(callback_url),
+            title="github update repository hook",
+            raise_for_status=True,
+            idempotent=True,
         )
 
+    def _hook_missing(self, org_name: str, repo_name: str, callback_url: str) -> bool:
+        hooks = self.iter_repository_hooks(org_name=org_name, repo_name=repo_name)
+        return not any(hook.get("config", {}).get("url") == callback_url for hook in hooks)
+
     def create_pull_request(self, org_name: str, repo_name: str, pr_title: str, head: str, base: str) -> requests.Response:
         logging.info("Github create pull request...")
         return self.http_client.post(
@@ -78,4 +131,108 @@ class GithubApiClient:
             json={"title": pr_title, "head": head, "base": base},
             title="github create pull request",
             raise_for_status=True,
+            retry_check=lambda: self._pull_request_missing(org_name=org_name, repo_name=repo_name, head=head),
+        )
+
+    def _pull_request_missing(self, org_name: str, repo_name: str, head: str) -> bool:
+        return not self.list_open_pull_requests(org_name=org_name, repo_name=repo_name, head=head).json()
+
+    def list_open_pull_requests(self, org_name: str, repo_name: str, head: str) -> requests.Response:
+        return self.http_client.get(
+            url=LIST_PULL_REQUESTS_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name),
+            headers=self.headers,
+            params=dict(head=f"{org_name}:{head}", state="open"),
+            title="github list pull requests",
+            raise_for_status=True,
+        )
+
+    def pull_request_url(self, org_name: str, repo_name: str, number: int) -> str:
+        # Same link the rest api returns in the url field of a pull request
+        return PULL_REQUEST_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name, number=number)
+
+    def query_repositories(self, repositories: List[Tuple[str, str]], head: str) -> requests.Response:
+        # One aliased field per repository, missing ones come back as null with a NOT_FOUND error
+        fields = " ".join(
+            f"r{index}: repository(owner: {json.dumps(org_name)}, name: {json.dumps(repo_name)}) "
+            f"{{ {REPOSITORY_FIELDS.format(head=json.dumps(head))} }}"
+            for index, (org_name, repo_name) in enumerate(repositories)
+        )
+        return self.http_client.post(
+            url=GRAPHQL_SERVICE_URL.format(domain=self.domain),
+            headers=self.headers,
+            json={"query": f"query {{ {fields} }}"},
+            title="github graphql repositories",
+            raise_for_status=True,
+            idempotent=True,
+        )
+
+    def get_branch_ref(self, org_name: str, repo_name: str, branch: str) -> requests.Response:
+        return self.http_client.get(
+            url=GET_BRANCH_REF_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name, branch=branch),
+            headers=self.headers,
+            title="github get branch ref",
+            raise_for_status=False,
+        )
+
+    def get_raw_content(self, org_name: str, repo_name: str, path: str, ref: str) -> requests.Response:
+        return self.http_client.get(
+            url=GET_CONTENT_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name, path=path),
+            headers={**self.headers, "Accept": "application/vnd.github.raw+json"},
+            params=dict(ref=ref),
+            title="github get content",
+            raise_for_status=False,
+        )
+
+    def get_commit(self, org_name: str, repo_name: str, sha: str) -> requests.Response:
+        return self.http_client.get(
+            url=GET_COMMIT_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name, sha=sha),
+            headers=self.headers,
+            title="github get commit",
+            raise_for_status=True,
+        )
+
+    def create_tree(self, org_name: str, repo_name: str, base_tree: str, files: Dict[str, Optional[str]]) -> requests.Response:
+        return self.http_client.post(
+            url=CREATE_TREE_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name),
+            headers=self.headers,
+            json={
+                "base_tree": base_tree,
+                # A null sha removes the path from the base tree
+                "tree": [
+                    {"path": path, "mode": "100644", "type": "blob", **({"sha": None} if content is None else {"content": content})}
+                    for path, content in files.items()
+                ],
+            },
+            title="github create tree",
+            raise_for_status=True,
+            idempotent=True,
+        )
+
+    def create_commit(self, org_name: str, repo_name: str, message: str, tree: str, parent: str) -> requests.Response:
+        return self.http_client.post(
+            url=CREATE_COMMIT_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name),
+            headers=self.headers,
+            json={"message": message, "tree": tree, "parents": [parent]},
+            title="github create commit",
+            raise_for_status=True,
+            idempotent=True,
+        )
+
+    def create_branch_ref(self, org_name: str, repo_name: str, branch: str, sha: str) -> requests.Response:
+        return self.http_client.post(
+            url=CREATE_REF_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name),
+            headers=self.headers,
+            json={"ref": f"refs/heads/{branch}", "sha": sha},
+            title="github create branch",
+            raise_for_status=True,
+        )
+
+    def update_branch_ref(self, org_name: str, repo_name: str, branch: str, sha: str) -> requests.Response:
+        return self.http_client.patch(
+            url=UPDATE_REF_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name, branch=branch),
+            headers=self.headers,
+            json={"sha": sha, "force": False},
+            title="github update branch",
+            raise_for_status=True,
+            idempotent=True,
         )
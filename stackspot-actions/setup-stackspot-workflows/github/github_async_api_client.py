@@ -0,0 +1,34 @@
+from typing import AsyncIterator
+
+from github.github_api_client import GET_REPOSITORY_HOOKS_SERVICE_URL, PAGE_SIZE, GithubApiClient
+from helpers.async_http_client import AsyncApiClient, AsyncHttpClient
+
+
+class GithubAsyncApiClient(AsyncApiClient, GithubApiClient):
+    def __init__(self, **kwargs):
+        super().__init__(**dict(kwargs, http_client=kwargs.get("http_client") or AsyncHttpClient.default()))
+
+    async def _repository_missing(self, org_name: str, repo_name: str) -> bool:
+        response = await self.get_repository(org_name=org_name, repo_name=repo_name, raise_for_status=False)
+        return response.status_code == 404
+
+    async def iter_repository_hooks(self, org_name: str, repo_name: str) -> AsyncIterator[dict]:
+        async for response in self.http_client.get_pages(
+            url=GET_REPOSITORY_HOOKS_SERVICE_URL.format(domain=self.domain, org_name=org_name, repo_name=repo_name),
+            headers=self.headers,
+            params=dict(per_page=PAGE_SIZE),
+            title="github get repository hooks",
+            raise_for_status=True,
+            cacheable=True,
+        ):
+            for hook in response.json():
+                yield hook
+
+    async def _hook_missing(self, org_name: str, repo_name: str, callback_url: str) -> bool:
+        async for hook in self.iter_repository_hooks(org_name=org_name, repo_name=repo_name):
+            if hook.get("config", {}).get("url") == callback_url:
+                return False
+        return True
+
+    async def _pull_request_missing(self, org_name: str, repo_name: str, head: str) -> bool:
+        return not (await self.list_open_pull_requests(org_name=org_name, repo_name=repo_name, head=head)).json()
@@ -1,18 +1,36 @@
+import base64
+from typing import Iterable, Iterator, List, Optional, Set
+from urllib.parse import quote
+
 import requests
 
+from helpers.http_client import HttpClient
+from helpers.ttl_cache import TtlCache
+
 GET_GROUP_SERVICE_URL = "https://{domain}/v4/groups/{group_name}"
+SEARCH_GROUPS_SERVICE_URL = "https://{domain}/v4/groups"
 GET_PROJECT_SERVICE_URL = "https://{domain}/v4/projects/{project_id}"
 CREATE_PROJECT_SERVICE_URL = "https://{domain}/v4/projects"
 CREATE_TRIGGER_SERVICE_URL = "https://{domain}/v4/projects/{project_id}/triggers"
 CREATE_MERGE_REQUEST_SERVICE_URL = "https://{domain}/v4/projects/{project_id}/merge_requests"
+GET_NAMESPACE_SERVICE_URL = "https://{domain}/v4/namespaces/{namespace_id}"
+GET_BRANCH_SERVICE_URL = "https://{domain}/v4/projects/{project_id}/repository/branches/{branch}"
+GET_RAW_FILE_SERVICE_URL = "https://{domain}/v4/projects/{project_id}/repository/files/{file_path}/raw"
+CREATE_COMMIT_SERVICE_URL = "https://{domain}/v4/projects/{project_id}/repository/commits"
+
+TRIGGER_DESCRIPTION = "Stackspot workflow trigger token"
+PAGE_SIZE = 100
+GROUP_CACHE_TTL = 600.0
 
 
 class GitlabApiClient:
     def __init__(self, **kwargs):
-        self.http_client = kwargs.get("http_client")
+        self.http_client = kwargs.get("http_client") or HttpClient.default()
         self.pat = kwargs.get("pat")
         self.domain = f"{kwargs.get('api_domain')}/api"
         self.auth_params = dict(private_token=self.pat)
+        # Group path -> group, shared by every project created with this client
+        self.groups = TtlCache(ttl=GROUP_CACHE_TTL)
 
     def create_project(self, project_name: str, namespace_id: str):
         return self.http_client.post(
@@ -28,15 +46,48 @@ class GitlabApiClient:
             ),
             title="gitlab create repository",
             raise_for_status=True,
+            retry_check=lambda: self._project_missing(namespace_id=namespace_id, project_name=project_name),
         )
 
-    def create_trigger(self, project_id: str) -> requests.Response:
+    def _project_missing(self, namespace_id: str, project_name: str) -> bool:
+        namespace = self.get_namespace(namespace_id=namespace_id).json()
+        response = self.get_project(
+            group_name=quote(namespace["full_path"], safe=""), project_name=project_name, raise_for_status=False
+        )
+        return response.status_code == 404
+
+    def create_trigger(self, project_id: str, known_ids: Iterable[int] = ()) -> requests.Response:
         return self.http_client.post(
             url=CREATE_TRIGGER_SERVICE_URL.format(domain=self.domain, project_id=project_id),
             params=self.auth_params,
-            json=dict(description="Stackspot workflow trigger token"),
+            json=dict(description=TRIGGER_DESCRIPTION),
             title="gitlab create trigger",
             raise_for_status=True,
+            retry_check=lambda: self._trigger_missing(project_id=project_id, known_ids=set(known_ids)),
+        )
+
+    def get_namespace(self, namespace_id: str) -> requests.Response:
+        return self.http_client.get(
+            url=GET_NAMESPACE_SERVICE_URL.format(domain=self.domain, namespace_id=namespace_id),
+            params=self.auth_params,
+            title="gitlab get namespace",
+            raise_for_status=True,
+            cacheable=True,
+        )
+
+    def _trigger_missing(self, project_id: str, known_ids: Set[int]) -> bool:
+        # Only a trigger that was not there before the attempt proves the failed post went through
+        triggers = self.list_triggers(project_id=project_id).json()
+        return not any(
+            trigger.get("description") == TRIGGER_DESCRIPTION and trigger["id"] not in known_ids for trigger in triggers
+        )
+
+    def list_triggers(self, project_id: str) -> requests.Response:
+        return self.http_client.get(
+            url=CREATE_TRIGGER_SERVICE_URL.format(domain=self.domain, project_id=project_id),
+            params=self.auth_params,
+            title="gitlab list triggers",
+            raise_for_status=True,
         )
 
     def create_merge_request(self, project_id: str, pr_title: str, pr_description: str, source_branch: str, target_branch: str):
@@ -51,6 +102,18 @@ class GitlabApiClient:
             ),
             title="gitlab create merge request",
             raise_for_status=True,
+            retry_check=lambda: self._merge_request_missing(project_id=project_id, source_branch=source_branch),
+        )
+
+    def _merge_request_missing(self, project_id: str, source_branch: str) -> bool:
+        return not self.list_opened_merge_requests(project_id=project_id, source_branch=source_branch).json()
+
+    def list_opened_merge_requests(self, project_id: str, source_branch: str):
+        return self.http_client.get(
+            url=CREATE_MERGE_REQUEST_SERVICE_URL.format(domain=self.domain, project_id=project_id),
+            params=dict(source_branch=source_branch, state="opened", **self.auth_params),
+            title="gitlab list merge requests",
+            raise_for_status=True,
         )
 
     def get_project(self, group_name: str, project_name: str, raise_for_status: bool = True):
@@ -59,12 +122,89 @@ class GitlabApiClient:
             params=self.auth_params,
             title="gitlab get project",
             raise_for_status=raise_for_status,
+            cacheable=True,
         )
 
-    def get_group(self, group_name: str):
+    def get_group(self, group_name: str, raise_for_status: bool = True):
         return self.http_client.get(
-            url=GET_GROUP_SERVICE_URL.format(domain=self.domain, group_name=group_name),
+            url=GET_GROUP_SERVICE_URL.format(domain=self.domain, group_name=quote(group_name, safe="")),
             params=self.auth_params,
             title="gitlab get group",
+            raise_for_status=raise_for_status,
+            cacheable=True,
+        )
+
+    def search_groups(self, search: str, page: str = "1"):
+        return self.http_client.get(
+            url=SEARCH_GROUPS_SERVICE_URL.format(domain=self.domain),
+            params=dict(search=search, per_page=PAGE_SIZE, page=page, **self.auth_params),
+            title="gitlab search groups",
+            raise_for_status=True,
+            cacheable=True,
+        )
+
+    def iter_search_groups(self, search: str) -> Iterator[dict]:
+        page = "1"
+        while page:
+            response = self.search_groups(search=search, page=page)
+            yield from response.json()
+            page = response.headers.get("X-Next-Page")
+
+    @staticmethod
+    def _matching_group(group_name: str, groups: Iterator[dict]) -> Optional[dict]:
+        for group in groups:
+            if group_name in (group.get("full_path"), group.get("name")):
+                return group
+        return None
+
+    def _find_group(self, group_name: str) -> Optional[dict]:
+        # The full path resolves directly, a display name needs a search
+        response = self.get_group(group_name=group_name, raise_for_status=False)
+        if response.ok:
+            return response.json()
+        if response.status_code != 404:
+            response.raise_for_status()
+        return self._matching_group(group_name, self.iter_search_groups(search=group_name.rsplit("/", 1)[-1]))
+
+    def resolve_group(self, group_name: str) -> Optional[dict]:
+        return self.groups.get_or_set(group_name, lambda: self._find_group(group_name=group_name))
+
+    def get_branch(self, project_id: str, branch: str):
+        return self.http_client.get(
+            url=GET_BRANCH_SERVICE_URL.format(domain=self.domain, project_id=project_id, branch=quote(branch, safe="")),
+            params=self.auth_params,
+            title="gitlab get branch",
+            raise_for_status=False,
+        )
+
+    def get_raw_file(self, project_id: str, file_path: str, ref: str):
+        return self.http_client.get(
+            url=GET_RAW_FILE_SERVICE_URL.format(domain=self.domain, project_id=project_id, file_path=quote(file_path, safe="")),
+            params=dict(ref=ref, **self.auth_params),
+            title="gitlab get file",
+            raise_for_status=False,
+        )
+
+    def create_commit(self, project_id: str, branch: str, start_branch: Optional[str], message: str, actions: List[dict]):
+        return self.http_client.post(
+            url=CREATE_COMMIT_SERVICE_URL.format(domain=self.domain, project_id=project_id),
+            params=self.auth_params,
+            json=dict(
+                branch=branch,
+                **(dict(start_branch=start_branch) if start_branch else {}),
+                commit_message=message,
+                actions=[
+                    dict(
+                        action=action["action"],
+                        file_path=action["file_path"],
+                        **(
+                            dict(content=base64.b64encode(action["content"]).decode(), encoding="base64")
+                            if action["content"] is not None else {}
+                        ),
+                    )
+                    for action in actions
+                ],
+            ),
+            title="gitlab create commit",
             raise_for_status=True,
         )
@@ -0,0 +1,52 @@
+from typing import AsyncIterator, Optional, Set
+from urllib.parse import quote
+
+from gitlab.gitlab_api_client import TRIGGER_DESCRIPTION, GitlabApiClient
+from helpers.async_http_client import AsyncApiClient, AsyncHttpClient
+
+
+class GitlabAsyncApiClient(AsyncApiClient, GitlabApiClient):
+    def __init__(self, **kwargs):
+        super().__init__(**dict(kwargs, http_client=kwargs.get("http_client") or AsyncHttpClient.default()))
+
+    async def _project_missing(self, namespace_id: str, project_name: str) -> bool:
+        namespace = (await self.get_namespace(namespace_id=namespace_id)).json()
+        response = await self.get_project(
+            group_name=quote(namespace["full_path"], safe=""), project_name=project_name, raise_for_status=False
+        )
+        return response.status_code == 404
+
+    async def _trigger_missing(self, project_id: str, known_ids: Set[int]) -> bool:
+        triggers = (await self.list_triggers(project_id=project_id)).json()
+        return not any(
+            trigger.get("description") == TRIGGER_DESCRIPTION and trigger["id"] not in known_ids for trigger in triggers
+        )
+
+    async def _merge_request_missing(self, project_id: str, source_branch: str) -> bool:
+        return not (await self.list_opened_merge_requests(project_id=project_id, source_branch=source_branch)).json()
+
+    async def iter_search_groups(self, search: str) -> AsyncIterator[dict]:
+        page = "1"
+        while page:
+            response = await self.search_groups(search=search, page=page)
+            for group in response.json():
+                yield group
+            page = response.headers.get("X-Next-Page")
+
+    async def _find_group(self, group_name: str) -> Optional[dict]:
+        response = await self.get_group(group_name=group_name, raise_for_status=False)
+        if response.ok:
+            return response.json()
+        if response.status_code != 404:
+            response.raise_for_status()
+        async for group in self.iter_search_groups(search=group_name.rsplit("/", 1)[-1]):
+            if self._matching_group(group_name, [group]):
+                return group
+        return None
+
+    async def resolve_group(self, group_name: str) -> Optional[dict]:
+        group = self.groups.get(group_name)
+        if group is None:
+            group = await self._find_group(group_name=group_name)
+            group is not None and self.groups.set(group_name, group)
+        return group
@@ -0,0 +1,188 @@
+import asyncio
+import inspect
+import logging
+from collections import Counter
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from helpers.exceptions import AsyncClientUnavailableException
+from helpers.http_client import HttpClient
+from helpers.retry import IDEMPOTENT_METHODS
+from helpers.tracing import HTTP, tracer
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def to_response(response: "httpx.Response") -> requests.Response:
+    # Callers keep the requests interface: ok, json(), raise_for_status()...
+    result = requests.Response()
+    result.status_code = response.status_code
+    result.reason = response.reason_phrase
+    result.headers = CaseInsensitiveDict(response.headers.multi_items())
+    result.url = str(response.url)
+    result.encoding = response.encoding
+    result.elapsed = response.elapsed
+    result._content = response.content
+    prepared = requests.PreparedRequest()
+    prepared.method = response.request.method
+    prepared.url = str(response.request.url)
+    prepared.headers = CaseInsensitiveDict(response.request.headers.multi_items())
+    prepared.body = response.request.content
+    result.request = prepared
+    return result
+
+
+async def gather_bounded(awaitables: Iterable[Awaitable], limit: int, return_exceptions: bool = False) -> List:
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(awaitable: Awaitable):
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*(run(awaitable) for awaitable in awaitables), return_exceptions=return_exceptions)
+
+
+class AsyncHttpClient(HttpClient):
+    _default: "AsyncHttpClient" = None
+
+    def __init__(self, **kwargs):
+        if httpx is None:
+            raise AsyncClientUnavailableException()
+        super().__init__(**kwargs)
+        self.clients: Dict[str, "httpx.AsyncClient"] = {}
+        self.slots: Dict[str, asyncio.Semaphore] = {}
+        self.requests = Counter()
+        self._loop = None
+
+    def client(self, url: str) -> "httpx.AsyncClient":
+        # httpx clients belong to the event loop that created them
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # The clients of the previous loop were closed when it shut down
+            self.clients, self.slots, self._loop = {}, {}, loop
+            loop.create_task(self._close_on_shutdown(self.clients))
+        host = urlsplit(url).netloc
+        client = self.clients.get(host)
+        if client is None:
+            # Waiting here is cheap, httpcore walks its whole queue of pending requests on every release
+            self.slots[host] = asyncio.Semaphore(self.pool_size)
+            client = self.clients[host] = httpx.AsyncClient(
+                verify=self._verify(),
+                timeout=httpx.Timeout(None),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size if self.keep_alive else 0,
+                ),
+            )
+        return client
+
+    def connection_stats(self) -> Dict[str, Dict[str, int]]:
+        return {host: dict(requests=count) for host, count in self.requests.items()}
+
+    def log_connection_stats(self):
+        for host, stats in self.connection_stats().items():
+            logging.info(f"Async requests to {host}: {stats['requests']}")
+
+    async def aclose(self):
+        clients = list(self.clients.values())
+        self.clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    @staticmethod
+    async def _close_on_shutdown(clients: Dict[str, "httpx.AsyncClient"]):
+        # Pending until the loop cancels its tasks on shutdown (asyncio.run does), the clients are closed while it still runs
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            for client in list(clients.values()):
+                await client.aclose()
+
+    async def _should_retry(
+        self,
+        attempt: int,
+        resp: Optional[requests.Response],
+        idempotent: bool,
+        retry_check: Optional[Callable[[], bool]],
+    ) -> bool:
+        decision = self._retry_decision(attempt, resp, idempotent)
+        if decision is not None:
+            return decision
+        if retry_check is None:
+            return False
+        result = retry_check()
+        return bool(await result if inspect.isawaitable(result) else result)
+
+    async def _call(
+        self,
+        method: str,
+        url: str,
+        title: str = str(),
+        raise_for_status: bool = False,
+        idempotent: Optional[bool] = None,
+        retry_check: Optional[Callable[[], bool]] = None,
+        cacheable: bool = False,
+        cache_scope: Optional[str] = None,
+        **kwargs
+    ) -> requests.Response:
+        self._log_request(method, url, title)
+        cache_key, cache_entry = self._cache_lookup(method, url, cacheable, cache_scope, kwargs)
+        idempotent = method in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        budget_key = self.rate_limiter.key(url, kwargs.get("headers"), kwargs.get("params"))
+        with tracer.span(f"{method.upper()} {urlsplit(url).netloc}", kind=HTTP, operation=title or method) as span:
+            attempt = 0
+            throttled = 0.0
+            while True:
+                attempt += 1
+                delay = self.rate_limiter.reserve(budget_key)
+                throttled += delay
+                delay > 0 and await asyncio.sleep(delay)
+                self.requests[urlsplit(url).netloc] += 1
+                client = self.client(url)
+                try:
+                    async with self.slots[urlsplit(url).netloc]:
+                        resp = to_response(await client.request(method.upper(), url, **kwargs))
+                except httpx.TransportError as e:
+                    self.rate_limiter.release(budget_key)
+                    if not await self._should_retry(attempt, None, idempotent, retry_check):
+                        span.set(retries=attempt - 1)
+                        raise requests.ConnectionError(str(e)) from e
+                    delay = self.retry_policy.delay(attempt)
+                    logging.info(f"Request failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+                    continue
+                self.rate_limiter.update(budget_key, resp)
+                if resp.ok or not await self._should_retry(attempt, resp, idempotent, retry_check):
+                    break
+                delay = self.retry_policy.delay(attempt, resp)
+                logging.info(f"Response status code: {resp.status_code}, retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+            self._finish(span, method, url, resp, attempt, throttled)
+            resp = self._cache_result(cache_key, cache_entry, cacheable, url, title, kwargs, span, resp)
+        self._log_response(resp, raise_for_status, kwargs.get("json"))
+        return resp
+
+    async def get_pages(self, url: str, **kwargs) -> AsyncIterator[requests.Response]:
+        while url:
+            response = await self.get(url=url, **kwargs)
+            yield response
+            url = response.links.get("next", {}).get("url")
+            kwargs.pop("params", None)
+
+
+class AsyncApiClient:
+    async def authenticate(self):
+        pass
+
+    async def __aenter__(self):
+        await self.authenticate()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
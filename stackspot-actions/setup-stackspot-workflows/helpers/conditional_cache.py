@@ -0,0 +1,66 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from helpers.metadata_cache import CacheEntry, MetadataCache
+
+# Bigger bodies are file contents or listings, not worth keeping in memory
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class ConditionalCache:
+    def __init__(self, max_entries: int = 1024, store: MetadataCache = None):
+        self.max_entries = max_entries
+        self.store = store
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.revalidations = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, store: MetadataCache = None) -> Optional["ConditionalCache"]:
+        max_entries = int(os.getenv("HTTP_CONDITIONAL_CACHE_SIZE") or 1024)
+        if max_entries <= 0 and store is None:
+            return None
+        return cls(max_entries=max_entries, store=store)
+
+    def _remember(self, key: str, entry: CacheEntry):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, key: str, persisted: bool = False) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry
+        if not persisted or self.store is None:
+            return None
+        entry = self.store.get(key)
+        if entry is not None:
+            with self._lock:
+                self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry, persisted: bool = False, **metadata):
+        if len(entry.body) > MAX_BODY_SIZE:
+            return
+        with self._lock:
+            self._remember(key, entry)
+        if persisted and self.store is not None:
+            self.store.put(key, entry=entry, **metadata)
+
+    def revalidated(self, key: str, persisted: bool = False):
+        with self._lock:
+            self.revalidations += 1
+        if persisted and self.store is not None:
+            self.store.revalidated(key)
+
+    def log_stats(self):
+        logging.info(f"Conditional requests: {self.revalidations} answered with 304, {len(self.entries)} entries in memory")
+        self.store and self.store.log_stats()
@@ -0,0 +1,156 @@
+import io
+import logging
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional
+
+from helpers.exceptions import CloningRepoException, GitBackendUnavailableException, GitOperationException
+from helpers.git_helper import CloneMode, Git
+from helpers.process import redact
+from helpers.tracing import GIT, tracer
+
+try:
+    from dulwich import porcelain
+    from dulwich.diff_tree import tree_changes
+    from dulwich.object_store import commit_tree_changes, tree_lookup_path
+    from dulwich.objects import Commit
+    from dulwich.repo import Repo
+except ImportError:
+    porcelain = None
+
+# Sparse checkouts are not supported, the sparse mode checks out every file of the shallow clone
+CLONE_OPTIONS = {
+    CloneMode.FULL: dict(),
+    CloneMode.SHALLOW: dict(depth=1),
+    CloneMode.BLOBLESS: dict(filter_spec="blob:none"),
+    CloneMode.SPARSE: dict(depth=1),
+}
+
+
+@contextmanager
+def _operation(name: str, error: Optional[type] = None) -> Iterator[None]:
+    with tracer.span(name, kind=GIT, operation=name):
+        try:
+            yield
+        except Exception as e:
+            logging.error(redact(f"{type(e).__name__}: {e}"))
+            if error is not None:
+                raise error()
+            raise GitOperationException(name, redact(str(e) or type(e).__name__))
+
+
+class DulwichGit(Git):
+    # Same interface as Git, objects are written and pushed in process instead of spawning git for every step
+
+    def __init__(self):
+        if porcelain is None:
+            raise GitBackendUnavailableException()
+
+    @staticmethod
+    def clone(
+        clone_url: str,
+        workdir: str,
+        mode: CloneMode = CloneMode.FULL,
+        sparse_paths: Iterable[str] = (),
+        reference: Optional[str] = None,
+    ):
+        # Objects of the reference mirror are not borrowed, the clone downloads them
+        logging.info(f"Cloning repository ({mode.value} clone)...")
+        with _operation("git clone", error=CloningRepoException):
+            porcelain.clone(clone_url, workdir, errstream=io.BytesIO(), **CLONE_OPTIONS[mode]).close()
+
+    @staticmethod
+    def add_sparse_paths(paths: Iterable[str], workdir: str):
+        # Every file is already checked out
+        pass
+
+    @staticmethod
+    def status(workdir: str) -> List[str]:
+        with _operation("git status"), Repo(workdir) as repo:
+            status = porcelain.status(repo)
+        # Porcelain lines: the providers only look for changes and for new files
+        changed = [path for paths in status.staged.values() for path in paths] + list(status.unstaged)
+        return [f" M {_decode(path)}" for path in changed] + [f"?? {_decode(path)}" for path in status.untracked]
+
+    @staticmethod
+    def commit(msg: str, workdir: str, add_untracked: bool = True):
+        logging.info(f'git commit --all -m "{msg}"')
+        with _operation("git commit"), Repo(workdir) as repo:
+            if add_untracked:
+                porcelain.add(repo)
+            porcelain.commit(repo, message=msg, all=True)
+
+    @staticmethod
+    def push(branch: str, workdir: str):
+        logging.info(f"git push --atomic origin {branch}")
+        with _operation("git push"), Repo(workdir) as repo:
+            porcelain.push(
+                repo,
+                "origin",
+                refspecs=f"refs/heads/{branch}",
+                atomic=True,
+                outstream=io.BytesIO(),
+                errstream=io.BytesIO(),
+            )
+
+    @staticmethod
+    def commit_on_remote_branch(branch: str, paths: Iterable[str], msg: str, workdir: str) -> bool:
+        ref = f"refs/heads/{branch}".encode()
+        with _operation("git fetch"), Repo(workdir) as repo:
+            tip = porcelain.fetch(repo, "origin", depth=1, outstream=io.StringIO(), errstream=io.BytesIO()).refs.get(ref)
+        if not tip:
+            return True
+        logging.info(f"Branch {branch} already exists, committing on top of it...")
+        with _operation("git commit"), Repo(workdir) as repo:
+            head = repo[repo.head()]
+            changed = {
+                # The side of an added or deleted path is None (or an empty entry in older dulwich versions)
+                getattr(change.new, "path", None) or change.old.path
+                for change in tree_changes(repo.object_store, repo[head.parents[0]].tree, head.tree)
+            }
+            changes = []
+            for path in sorted({path.encode() for path in paths} | changed):
+                entry = _tree_entry(repo, head.tree, path)
+                # Paths the branch does not have either can not be deleted from it
+                if entry or _tree_entry(repo, repo[tip].tree, path):
+                    changes.append((path, *(entry or (None, None))))
+            tree = commit_tree_changes(repo.object_store, repo[repo[tip].tree], changes)
+            if tree == repo[tip].tree:
+                return False
+            commit = Commit()
+            commit.tree, commit.parents, commit.message = tree, [tip], msg.encode()
+            commit.author, commit.author_time, commit.author_timezone = head.author, head.author_time, head.author_timezone
+            commit.committer, commit.commit_time, commit.commit_timezone = head.committer, head.commit_time, head.commit_timezone
+            repo.object_store.add_object(commit)
+            repo.refs[ref] = commit.id
+            porcelain.reset(repo, "hard", commit.id)
+        return True
+
+    @staticmethod
+    def main_exists(workdir: str) -> bool:
+        logging.info("Checking if the main branch exists...")
+        with _operation("git ls-remote"), Repo(workdir) as repo:
+            url = repo.get_config().get((b"remote", b"origin"), b"url").decode()
+            result = porcelain.ls_remote(url, quiet=True)
+        return b"refs/heads/main" in getattr(result, "refs", result)
+
+    @staticmethod
+    def checkout(branch: str, workdir: str):
+        # Like checkout -b: the new branch starts at HEAD, the working tree and index are kept
+        logging.info(f"git checkout -b {branch}")
+        ref = f"refs/heads/{branch}".encode()
+        with _operation("git checkout"), Repo(workdir) as repo:
+            head = repo.refs.follow(b"HEAD")[1]
+            if head:
+                repo.refs.set_if_equals(ref, None, head)
+            repo.refs.set_symbolic_ref(b"HEAD", ref)
+
+
+def _tree_entry(repo: "Repo", tree: bytes, path: bytes) -> Optional[tuple]:
+    try:
+        return tree_lookup_path(repo.object_store.__getitem__, tree, path)
+    except KeyError:
+        return None
+
+
+def _decode(path) -> str:
+    return path.decode() if isinstance(path, bytes) else path
@@ -21,3 +21,53 @@ class RepositoryNeedsToExists(ActionException):
 class ProjectNeedsToExists(ActionException):
     def __init__(self):
         super().__init__(msg="Project needs to exist! Quiting...")
+
+
+class InvalidManifestException(ActionException):
+    def __init__(self, msg: str):
+        super().__init__(msg=msg)
+
+
+class ResourceNotReadyException(ActionException):
+    def __init__(self, resource: str, timeout: float):
+        super().__init__(msg=f"{resource} was not ready after {timeout:.0f}s! Quiting...")
+
+
+class ResourceCreationFailed(ActionException):
+    def __init__(self, resource: str, status: str):
+        super().__init__(msg=f"{resource} creation finished with status '{status}'! Quiting...")
+
+
+class AsyncClientUnavailableException(ActionException):
+    def __init__(self):
+        super().__init__(msg="httpx is needed by the async api clients, install it with 'pip install httpx'")
+
+
+class GroupNotFoundException(ActionException):
+    def __init__(self, group_name: str):
+        super().__init__(msg=f"Group {group_name} not found! Quiting...")
+
+
+class PlanMismatchException(ActionException):
+    def __init__(self, msg: str):
+        super().__init__(msg=msg)
+
+
+class CommandFailedException(ActionException):
+    def __init__(self, operation: str, exit_code: int):
+        super().__init__(msg=f"{operation} failed with exit code {exit_code}! Quiting...")
+
+
+class CommandTimeoutException(ActionException):
+    def __init__(self, operation: str, timeout: float):
+        super().__init__(msg=f"{operation} did not finish after {timeout:.0f}s! Quiting...")
+
+
+class GitBackendUnavailableException(ActionException):
+    def __init__(self):
+        super().__init__(msg="dulwich is needed by the in-process git backend, install it with 'pip install dulwich'")
+
+
+class GitOperationException(ActionException):
+    def __init__(self, operation: str, error: str):
+        super().__init__(msg=f"{operation} failed: {error}! Quiting...")
@@ -1,61 +1,106 @@
 import logging
-import subprocess
-import os
+from enum import Enum
+from typing import Iterable, List, Optional
 
 from helpers.exceptions import CloningRepoException
+from helpers.process import run_command
+
+
+class CloneMode(str, Enum):
+    FULL = "full"
+    # Only the tip of the default branch
+    SHALLOW = "shallow"
+    # Whole history without file contents, blobs are fetched on demand
+    BLOBLESS = "blobless"
+    # Tip of the default branch, checking out only root files and the given directories
+    SPARSE = "sparse"
+
+
+CLONE_ARGS = {
+    CloneMode.FULL: [],
+    CloneMode.SHALLOW: ["--depth", "1", "--single-branch"],
+    CloneMode.BLOBLESS: ["--filter=blob:none"],
+    CloneMode.SPARSE: ["--depth", "1", "--single-branch", "--filter=blob:none", "--sparse"],
+}
 
 
 class Git:
     @staticmethod
-    def clone(clone_url: str, workdir: str):
-        cmd = f"git clone {clone_url} {workdir}"
-        if os.system(cmd) != 0:
+    def clone(
+        clone_url: str,
+        workdir: str,
+        mode: CloneMode = CloneMode.FULL,
+        sparse_paths: Iterable[str] = (),
+        reference: Optional[str] = None,
+    ):
+        # Objects found in the reference are copied instead of downloaded, dissociate keeps the clone independent of it
+        reference_args = ["--reference-if-able", reference, "--dissociate"] if reference else []
+        cmd = ["git", "clone", *CLONE_ARGS[mode], *reference_args, clone_url, workdir]
+        logging.info(f"Cloning repository ({mode.value} clone)...")
+        if run_command("git clone", cmd, check=False).returncode != 0:
             raise CloningRepoException()
-        os.chdir(workdir)
+        if mode == CloneMode.SPARSE:
+            cmd = ["git", "sparse-checkout", "set", "--cone", *sparse_paths]
+            if run_command("git sparse-checkout", cmd, cwd=workdir, check=False).returncode != 0:
+                raise CloningRepoException()
 
     @staticmethod
-    def commit(msg: str):
-        cmd = f'git commit -m "{msg}"'
-        logging.info(cmd)
-        os.system(cmd)
+    def add_sparse_paths(paths: Iterable[str], workdir: str):
+        paths = list(paths)
+        if paths:
+            run_command("git sparse-checkout", ["git", "sparse-checkout", "add", *paths], cwd=workdir)
 
     @staticmethod
-    def push(branch: str):
-        cmd = f"git push -u origin {branch}"
-        logging.info(cmd)
-        os.system(cmd)
+    def status(workdir: str) -> List[str]:
+        result = run_command("git status", ["git", "status", "--porcelain"], cwd=workdir)
+        return result.stdout.splitlines()
 
     @staticmethod
-    def add():
-        cmd = f"git add ."
-        logging.info(cmd)
-        os.system(cmd)
+    def commit(msg: str, workdir: str, add_untracked: bool = True):
+        # commit --all stages the tracked changes itself, git add is only spawned for new files
+        if add_untracked:
+            run_command("git add", ["git", "add", "--all"], cwd=workdir)
+        logging.info(f'git commit --all -m "{msg}"')
+        run_command("git commit", ["git", "commit", "--all", "--quiet", "-m", msg], cwd=workdir)
 
     @staticmethod
-    def main_exists() -> bool:
-        logging.info("Checking if the main branch exists...")
-        result = subprocess.run(
-            ["git", "ls-remote", "--heads", "origin", "main"],
-            capture_output=True,
-            text=True,
-        )
-        return bool(result.stdout)
+    def push(branch: str, workdir: str):
+        # Atomic: the remote takes every ref of the push or none of them
+        cmd = ["git", "push", "--atomic", "--quiet", "-u", "origin", branch]
+        logging.info(" ".join(cmd))
+        run_command("git push", cmd, cwd=workdir)
 
     @staticmethod
-    def checkout(branch: str):
-        cmd = f"git checkout -b {branch}"
-        logging.info(cmd)
-        os.system(cmd)
+    def commit_on_remote_branch(branch: str, paths: Iterable[str], msg: str, workdir: str) -> bool:
+        # The last commit is rebuilt on top of the remote branch: the given paths and the ones the commit changed take
+        # its content, every other file keeps the one of the branch. Returns whether there is anything to push
+        if not run_command("git ls-remote", ["git", "ls-remote", "--heads", "origin", branch], cwd=workdir).stdout:
+            return True
+        logging.info(f"Branch {branch} already exists, committing on top of it...")
+        commit = run_command("git rev-parse", ["git", "rev-parse", "HEAD"], cwd=workdir).stdout.strip()
+        changed = run_command("git diff", ["git", "diff", "--name-only", "--no-renames", "-z", "HEAD~1", "HEAD"], cwd=workdir)
+        paths = sorted(set(paths) | set(filter(None, changed.stdout.split("\0"))))
+        present = run_command("git ls-tree", ["git", "ls-tree", "-r", "-z", "--name-only", "HEAD", "--", *paths], cwd=workdir)
+        present = set(filter(None, present.stdout.split("\0")))
+        run_command("git fetch", ["git", "fetch", "--quiet", "--depth", "1", "origin", f"refs/heads/{branch}"], cwd=workdir)
+        run_command("git checkout", ["git", "checkout", "--quiet", "-B", branch, "FETCH_HEAD"], cwd=workdir)
+        if present:
+            run_command("git checkout", ["git", "checkout", commit, "--", *sorted(present)], cwd=workdir)
+        removed = [path for path in paths if path not in present]
+        if removed:
+            run_command("git rm", ["git", "rm", "--quiet", "--sparse", "--ignore-unmatch", "--", *removed], cwd=workdir)
+        if run_command("git diff", ["git", "diff", "--cached", "--quiet"], cwd=workdir, check=False).returncode == 0:
+            return False
+        run_command("git commit", ["git", "commit", "--quiet", "-m", msg], cwd=workdir)
+        return True
 
     @staticmethod
-    def is_status_changed():
-        result = subprocess.run(
-            ["git", "status", "--porcelain"],
-            capture_output=True,
-            text=True,
-        )
+    def main_exists(workdir: str) -> bool:
+        logging.info("Checking if the main branch exists...")
+        result = run_command("git ls-remote", ["git", "ls-remote", "--heads", "origin", "main"], cwd=workdir)
         return bool(result.stdout)
 
     @staticmethod
-    def init():
-        subprocess.run(["git", "init"])
+    def checkout(branch: str, workdir: str):
+        logging.info(f"git checkout -b {branch}")
+        run_command("git checkout", ["git", "checkout", "--quiet", "-b", branch], cwd=workdir)
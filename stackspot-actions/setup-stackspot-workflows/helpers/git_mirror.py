@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from helpers import util
+from helpers.exceptions import CloningRepoException
+from helpers.process import run_command
+
+
+class MirrorCache:
+    LAST_USED_MARKER = "stk-last-used"
+
+    def __init__(self, root: str, max_bytes: int, lock_timeout: float = 1800.0, poll_interval: float = 0.5):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+
+    @classmethod
+    def from_env(cls) -> Optional["MirrorCache"]:
+        root = os.getenv("STK_GIT_MIRROR_CACHE")
+        if not root:
+            return None
+        max_mb = int(os.getenv("STK_GIT_MIRROR_CACHE_MAX_MB") or 2048)
+        return cls(root=root, max_bytes=max_mb * 1024 * 1024)
+
+    @staticmethod
+    def cache_key(clone_url: str) -> str:
+        # Credentials are not part of the key, the same repository is shared whatever token cloned it
+        parts = urlsplit(clone_url)
+        netloc = (parts.hostname or "").lower() + (f":{parts.port}" if parts.port else "")
+        path = parts.path.rstrip("/")
+        path = path[:-4] if path.endswith(".git") else path
+        normalized = urlunsplit((parts.scheme, netloc, path, "", ""))
+        return hashlib.sha256(normalized.encode()).hexdigest()[:32]
+
+    def mirror_path(self, clone_url: str) -> Path:
+        return self.root / f"{self.cache_key(clone_url)}.git"
+
+    @staticmethod
+    def _lock_path(mirror: Path) -> Path:
+        return mirror.with_suffix(".lock")
+
+    def _try_lock(self, mirror: Path) -> bool:
+        lock_path = self._lock_path(mirror)
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime > self.lock_timeout:
+                    logging.info(f"Removing stale mirror lock {lock_path}")
+                    lock_path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+            return False
+        with os.fdopen(fd, "w") as lock_file:
+            lock_file.write(str(os.getpid()))
+        return True
+
+    @contextmanager
+    def _locked(self, mirror: Path) -> Iterator[None]:
+        while not self._try_lock(mirror):
+            time.sleep(self.poll_interval)
+        try:
+            yield
+        finally:
+            self._lock_path(mirror).unlink(missing_ok=True)
+
+    def _fetch(self, clone_url: str, mirror: Path):
+        if not mirror.exists():
+            logging.info(f"Creating git mirror {mirror}")
+            if run_command("git init", ["git", "init", "--bare", "--quiet", str(mirror)], check=False).returncode != 0:
+                raise CloningRepoException()
+        # The url is never stored into the mirror config, so the token does not end up on disk
+        cmd = ["git", "fetch", "--prune", "--no-tags", "--quiet", clone_url, "+refs/heads/*:refs/heads/*"]
+        if run_command("git fetch", cmd, cwd=mirror, check=False).returncode != 0:
+            raise CloningRepoException()
+        (mirror / self.LAST_USED_MARKER).touch()
+
+    @contextmanager
+    def use(self, clone_url: str) -> Iterator[Path]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        mirror = self.mirror_path(clone_url)
+        with self._locked(mirror):
+            self._fetch(clone_url, mirror)
+            yield mirror
+        self.evict(keep=mirror)
+
+    @staticmethod
+    def _size(path: Path) -> int:
+        return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+    def _last_used(self, mirror: Path) -> float:
+        marker = mirror / self.LAST_USED_MARKER
+        return marker.stat().st_mtime if marker.exists() else 0.0
+
+    def evict(self, keep: Optional[Path] = None):
+        mirrors = sorted(self.root.glob("*.git"), key=self._last_used)
+        sizes = {mirror: self._size(mirror) for mirror in mirrors}
+        total = sum(sizes.values())
+        for mirror in mirrors:
+            if total <= self.max_bytes:
+                break
+            if mirror == keep or not self._try_lock(mirror):
+                continue
+            try:
+                logging.info(f"Evicting git mirror {mirror}")
+                shutil.rmtree(mirror, onerror=util.on_delete_error, ignore_errors=True)
+                total -= sizes[mirror]
+            finally:
+                self._lock_path(mirror).unlink(missing_ok=True)
@@ -1,44 +1,321 @@
 import logging
 import os
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
 
 import requests
-from typing import Callable
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+
+from helpers.conditional_cache import ConditionalCache
+from helpers.metadata_cache import CacheEntry, MetadataCache
+from helpers.rate_limit import CREDENTIAL_PARAMS, RateLimiter, credential_fingerprint
+from helpers.retry import IDEMPOTENT_METHODS, RetryPolicy, is_rate_limited
+from helpers.tracing import HTTP, tracer
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class PooledAdapter(HTTPAdapter):
+    def __init__(self, pool_size: int, **kwargs):
+        self.opened = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        super().__init__(pool_connections=1, pool_maxsize=pool_size, **kwargs)
+
+    def _connection_opened(self):
+        with self._lock:
+            self.opened += 1
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        class CountingHTTPConnection(HTTPConnection):
+            def connect(self):
+                adapter._connection_opened()
+                super().connect()
+
+        class CountingHTTPSConnection(HTTPSConnection):
+            def connect(self):
+                adapter._connection_opened()
+                super().connect()
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = CountingHTTPConnection
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = CountingHTTPSConnection
+
+        self.poolmanager.pool_classes_by_scheme = dict(http=CountingHTTPConnectionPool, https=CountingHTTPSConnectionPool)
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.requests += 1
+        return super().send(request, **kwargs)
 
 
 class HttpClient:
-    def _call(
+    _default: "HttpClient" = None
+    _default_lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "HttpClient":
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def __init__(
         self,
-        method: Callable,
-        url: str,
-        title: str = str(),
-        raise_for_status: bool = False,
-        **kwargs
-    ) -> requests.Response:
+        pool_size: int = None,
+        keep_alive: bool = None,
+        retry_policy: RetryPolicy = None,
+        rate_limiter: RateLimiter = None,
+        metadata_cache: MetadataCache = None,
+    ):
+        self.pool_size = pool_size or _env_int("HTTP_POOL_SIZE", 10)
+        self.retry_policy = retry_policy or RetryPolicy.from_env()
+        self.rate_limiter = rate_limiter or RateLimiter.from_env()
+        self.metadata_cache = metadata_cache or MetadataCache.from_env()
+        self.conditional_cache = ConditionalCache.from_env(store=self.metadata_cache)
+        self.keep_alive = keep_alive if keep_alive is not None else os.getenv("HTTP_KEEP_ALIVE", "True") != "False"
+        self.sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def session(self, url: str) -> requests.Session:
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self.sessions.get(host)
+            if session is None:
+                # One pooled session per host, the TLS session is reused while the connection is kept alive
+                session = requests.Session()
+                adapter = PooledAdapter(pool_size=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                if not self.keep_alive:
+                    session.headers["Connection"] = "close"
+                self.sessions[host] = session
+        return session
+
+    def connection_stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {}
+        with self._lock:
+            sessions = dict(self.sessions)
+        for host, session in sessions.items():
+            counter = Counter()
+            for adapter in set(session.adapters.values()):
+                if isinstance(adapter, PooledAdapter):
+                    counter.update(opened=adapter.opened, requests=adapter.requests)
+            stats[host] = dict(
+                opened=counter["opened"],
+                reused=max(counter["requests"] - counter["opened"], 0),
+                requests=counter["requests"],
+            )
+        return stats
+
+    def log_connection_stats(self):
+        for host, stats in self.connection_stats().items():
+            logging.info(f"Connections to {host}: {stats['opened']} opened, {stats['reused']} reused ({stats['requests']} requests)")
+
+    def log_rate_limits(self):
+        self.rate_limiter.log_budgets()
+
+    def log_cache_stats(self):
+        self.conditional_cache and self.conditional_cache.log_stats()
+
+    def close(self):
+        with self._lock:
+            sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            session.close()
+
+    def _retry_decision(self, attempt: int, resp: Optional[requests.Response], idempotent: bool) -> Optional[bool]:
+        if attempt >= self.retry_policy.max_attempts:
+            return False
+        # A rate limited request was rejected before being processed
+        if resp is not None and is_rate_limited(resp):
+            return True
+        if resp is not None and resp.status_code not in self.retry_policy.retry_statuses:
+            return False
+        # None: not idempotent, only the caller can confirm the first attempt had no effect
+        return True if idempotent else None
+
+    def _should_retry(
+        self,
+        attempt: int,
+        resp: Optional[requests.Response],
+        idempotent: bool,
+        retry_check: Optional[Callable[[], bool]],
+    ) -> bool:
+        decision = self._retry_decision(attempt, resp, idempotent)
+        if decision is None:
+            return bool(retry_check and retry_check())
+        return decision
+
+    @staticmethod
+    def _verify() -> bool:
+        verify = os.getenv("REQUESTS_VERIFY", "True")
+        return False if verify == "False" else True
+
+    @staticmethod
+    def _log_request(method: str, url: str, title: str):
         logging.info(f"{'-'*(28 - int(len(title)/2))}[ {title} ]{'-'*(28 - int(len(title)/2))}")
-        logging.info(f"[{method.__name__.upper()}] {url}")
+        logging.info(f"[{method.upper()}] {url}")
         # logging.info(f"Headers: {kwargs.get('headers')}")
-        verify = os.getenv("REQUESTS_VERIFY", "True")
-        verify = False if verify == "False" else True
-        resp = method(url, verify=verify, **kwargs)
+
+    @staticmethod
+    def _finish(span, method: str, url: str, resp: requests.Response, attempt: int, throttled: float):
+        span.set(
+            method=method.upper(),
+            url=url,
+            status_code=resp.status_code,
+            bytes_sent=len(resp.request.body or b""),
+            bytes_received=len(resp.content),
+            retries=attempt - 1,
+            throttled=round(throttled, 3),
+        )
+        if not resp.ok:
+            span.status = "error"
+
+    @staticmethod
+    def _log_response(resp: requests.Response, raise_for_status: bool, body):
         logging.info(f"Response status code: {resp.status_code}")
         if raise_for_status and not resp.ok:
-            logging.info(f"Request body: {kwargs.get('json')}")
+            logging.info(f"Request body: {body}")
             logging.info(f"Response body: {resp.text}")
         if resp.ok or not raise_for_status:
             logging.info(f"{'-'*25}[ SUCCESS ]{'-'*25}")
         else:
             logging.info(f"{'-'*25}[ FAILURE ]{'-'*25}")
         raise_for_status and resp.raise_for_status()
+
+    @staticmethod
+    def _cache_key(url: str, kwargs: dict, scope: Optional[str] = None) -> Tuple[str, str]:
+        parts = urlsplit(url)
+        query = [
+            (name, str(value))
+            for name, value in parse_qsl(parts.query) + list((kwargs.get("params") or {}).items())
+            if name not in CREDENTIAL_PARAMS
+        ]
+        resource = parts.path + (f"?{urlencode(sorted(query))}" if query else "")
+        # Short lived tokens change every run, their clients give a stable scope instead
+        credential = credential_fingerprint(
+            dict(Authorization=scope) if scope else kwargs.get("headers"), None if scope else kwargs.get("params")
+        )
+        return MetadataCache.key(parts.netloc, resource, credential), resource
+
+    def _cache_lookup(self, method: str, url: str, cacheable: bool, scope: Optional[str], kwargs: dict) -> Tuple[Optional[str], Optional[CacheEntry]]:
+        # Every GET is revalidated, cacheable ones also outlive the run in the metadata cache
+        if method != "get" or self.conditional_cache is None:
+            return None, None
+        key, _ = self._cache_key(url, kwargs, scope)
+        entry = self.conditional_cache.get(key, persisted=cacheable)
+        if entry:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **entry.conditional_headers()}
+        return key, entry
+
+    def _cache_result(
+        self,
+        key: Optional[str],
+        entry: Optional[CacheEntry],
+        cacheable: bool,
+        url: str,
+        title: str,
+        kwargs: dict,
+        span,
+        resp: requests.Response,
+    ) -> requests.Response:
+        if key is None:
+            return resp
+        if resp.status_code == 304 and entry:
+            self.conditional_cache.revalidated(key, persisted=cacheable)
+            span.set(cache="revalidated")
+            return entry.to_response(resp)
+        new_entry = CacheEntry.from_response(resp) if resp.status_code == 200 else None
+        if new_entry is not None:
+            _, resource = self._cache_key(url, kwargs)
+            self.conditional_cache.put(
+                key,
+                new_entry,
+                persisted=cacheable,
+                provider=title.split(" ")[0] if title else urlsplit(url).netloc,
+                host=urlsplit(url).netloc,
+                resource=resource,
+            )
+        return resp
+
+    def _call(
+        self,
+        method: str,
+        url: str,
+        title: str = str(),
+        raise_for_status: bool = False,
+        idempotent: Optional[bool] = None,
+        retry_check: Optional[Callable[[], bool]] = None,
+        cacheable: bool = False,
+        cache_scope: Optional[str] = None,
+        **kwargs
+    ) -> requests.Response:
+        self._log_request(method, url, title)
+        verify = self._verify()
+        cache_key, cache_entry = self._cache_lookup(method, url, cacheable, cache_scope, kwargs)
+        idempotent = method in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        budget_key = self.rate_limiter.key(url, kwargs.get("headers"), kwargs.get("params"))
+        with tracer.span(f"{method.upper()} {urlsplit(url).netloc}", kind=HTTP, operation=title or method) as span:
+            attempt = 0
+            throttled = 0.0
+            while True:
+                attempt += 1
+                throttled += self.rate_limiter.acquire(budget_key)
+                try:
+                    resp = self.session(url).request(method, url, verify=verify, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    self.rate_limiter.release(budget_key)
+                    if not self._should_retry(attempt, None, idempotent, retry_check):
+                        span.set(retries=attempt - 1)
+                        raise
+                    delay = self.retry_policy.delay(attempt)
+                    logging.info(f"Request failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+                    time.sleep(delay)
+                    continue
+                self.rate_limiter.update(budget_key, resp)
+                if resp.ok or not self._should_retry(attempt, resp, idempotent, retry_check):
+                    break
+                delay = self.retry_policy.delay(attempt, resp)
+                logging.info(f"Response status code: {resp.status_code}, retrying in {delay:.1f}s...")
+                time.sleep(delay)
+            self._finish(span, method, url, resp, attempt, throttled)
+            resp = self._cache_result(cache_key, cache_entry, cacheable, url, title, kwargs, span, resp)
+        self._log_response(resp, raise_for_status, kwargs.get("json"))
         return resp
 
     def post(self, **kwargs):
-        return self._call(requests.post, **kwargs)
+        return self._call("post", **kwargs)
 
     def get(self, **kwargs):
-        return self._call(requests.get, **kwargs)
+        return self._call("get", **kwargs)
 
     def patch(self, **kwargs):
-        return self._call(requests.patch, **kwargs)
+        return self._call("patch", **kwargs)
 
     def put(self, **kwargs):
-        return self._call(requests.put, **kwargs)
+        return self._call("put", **kwargs)
+
+    def delete(self, **kwargs):
+        return self._call("delete", **kwargs)
+
+    def get_pages(self, url: str, **kwargs) -> Iterator[requests.Response]:
+        # Follows the Link header, the next url already carries the query parameters
+        while url:
+            response = self.get(url=url, **kwargs)
+            yield response
+            url = response.links.get("next", {}).get("url")
+            kwargs.pop("params", None)
@@ -0,0 +1,66 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from helpers.stk import Stk
+
+
+class SetupJournal:
+    DIR_NAME = "setup-journal"
+
+    def __init__(self, path: Path, branch: str):
+        self.path = path
+        self.branch = branch
+        self.stages: Dict[str, dict] = {}
+        self.state: Dict[str, Any] = {}
+        self._load()
+
+    @classmethod
+    def directory(cls) -> Optional[Path]:
+        value = os.getenv("STK_SETUP_JOURNAL")
+        if value == "False":
+            return None
+        return Path(value) if value and value != "True" else Stk.home() / cls.DIR_NAME
+
+    @classmethod
+    def open(cls, provider: str, target: str, branch: str) -> Optional["SetupJournal"]:
+        directory = cls.directory()
+        if directory is None:
+            return None
+        name = hashlib.sha256(f"{provider}:{target}".encode()).hexdigest()[:32]
+        return cls(directory / f"{name}.json", branch=branch)
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except ValueError:
+            logging.info(f"Ignoring unreadable setup journal {self.path}")
+            return
+        # Another branch means other templates, the files and pull request of the previous run do not apply
+        if data.get("branch") != self.branch:
+            logging.info(f"Ignoring setup journal of branch {data.get('branch')}")
+            return
+        self.stages, self.state = data.get("stages", {}), data.get("state", {})
+        self.stages and logging.info(f"Resuming setup after {', '.join(self.stages)}")
+
+    def done(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def result(self, stage: str) -> Any:
+        return self.stages[stage].get("result")
+
+    def record(self, stage: str, result: Any, state: Dict[str, Any]):
+        self.stages[stage] = dict(result=result)
+        self.state = state
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(dict(branch=self.branch, stages=self.stages, state=self.state), indent=2))
+        os.replace(tmp_path, self.path)
+
+    def complete(self):
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,171 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from helpers import stk as stk_module
+from helpers.stk import Stk
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    host TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    used_at REAL NOT NULL
+)
+"""
+# Headers describing the stored body, hop-by-hop and rate limit headers belong to the 304 answer
+KEPT_HEADERS = ("Content-Type", "Content-Encoding", "ETag", "Last-Modified", "Link", "X-Next-Page", "X-Total")
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    headers: Dict[str, str]
+    body: bytes
+
+    @classmethod
+    def from_response(cls, response: requests.Response) -> Optional["CacheEntry"]:
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return None
+        headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+        return cls(etag=etag, last_modified=last_modified, headers=headers, body=response.content)
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_response(self, not_modified: requests.Response) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict({**not_modified.headers, **self.headers})
+        response.url = not_modified.url
+        response.request = not_modified.request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = self.body
+        return response
+
+
+class MetadataCache:
+    FILE_NAME = "setup-metadata-cache.sqlite"
+
+    def __init__(self, path: str, ttl: float):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.hits = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Several runs may share the file, sqlite serializes the writers
+        self._connection = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(SCHEMA)
+
+    @classmethod
+    def default_path(cls) -> Path:
+        return Stk.home() / cls.FILE_NAME
+
+    @classmethod
+    def from_env(cls) -> Optional["MetadataCache"]:
+        value = os.getenv("STK_METADATA_CACHE")
+        if not value or value == "False":
+            return None
+        path = cls.default_path() if value == "True" else Path(value)
+        ttl_days = float(os.getenv("STK_METADATA_CACHE_TTL_DAYS") or 7)
+        cache = cls(path=str(path), ttl=ttl_days * 86400)
+        cache.evict()
+        return cache
+
+    @staticmethod
+    def key(host: str, resource: str, credential: str) -> str:
+        # Different credentials may see different bodies of the same resource
+        return f"{credential}:{host}{resource}"
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT etag, last_modified, headers, body FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(etag=row[0], last_modified=row[1], headers=json.loads(row[2]), body=row[3])
+
+    def put(self, key: str, provider: str, host: str, resource: str, entry: CacheEntry):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, host, resource, entry.etag, entry.last_modified, json.dumps(entry.headers), entry.body, time.time()),
+            )
+            self.stores += 1
+
+    def revalidated(self, key: str):
+        with self._lock:
+            self._connection.execute("UPDATE entries SET used_at = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+
+    def evict(self) -> int:
+        with self._lock:
+            return self._connection.execute("DELETE FROM entries WHERE used_at < ?", (time.time() - self.ttl,)).rowcount
+
+    def clear(self) -> int:
+        with self._lock:
+            return self._connection.execute("DELETE FROM entries").rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return dict(entries=entries, hits=self.hits, stores=self.stores)
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(f"Metadata cache {self.path}: {stats['hits']} revalidated, {stats['stores']} stored, {stats['entries']} entries")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the SCM metadata cache of setup-stackspot-workflows")
+    parser.add_argument("command", choices=["clear", "evict", "stats"])
+    parser.add_argument("--stk", default="stk", help="stk binary the action runs with, the cache is in its home")
+    parser.add_argument("--path")
+    parser.add_argument("--ttl-days", type=float, default=float(os.getenv("STK_METADATA_CACHE_TTL_DAYS") or 7))
+    args = parser.parse_args()
+    # Outside of stk the binary name is not argv[0], it is given so the default path is the one of the action
+    stk_module.stk = args.stk
+    env_path = os.getenv("STK_METADATA_CACHE")
+    path = args.path or (env_path if env_path not in (None, "", "True", "False") else str(MetadataCache.default_path()))
+    cache = MetadataCache(path=path, ttl=args.ttl_days * 86400)
+    if args.command == "clear":
+        print(f"{cache.clear()} entries removed from {cache.path}")
+    elif args.command == "evict":
+        print(f"{cache.evict()} expired entries removed from {cache.path}")
+    else:
+        print(json.dumps(cache.stats()))
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
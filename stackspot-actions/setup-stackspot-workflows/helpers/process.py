@@ -0,0 +1,49 @@
+import logging
+import os
+import re
+import subprocess
+from typing import List, Optional
+
+from helpers.exceptions import CommandFailedException, CommandTimeoutException
+from helpers.tracing import SUBPROCESS, tracer
+
+DEFAULT_TIMEOUT = 600.0
+# Clone urls carry the token, git repeats them in its errors
+CREDENTIALS_PATTERN = re.compile(r"(://)[^/@\s]+@")
+
+
+def redact(text: str) -> str:
+    return CREDENTIALS_PATTERN.sub(r"\1***@", text)
+
+
+def command_timeout() -> float:
+    return float(os.getenv("GIT_COMMAND_TIMEOUT") or DEFAULT_TIMEOUT)
+
+
+def run_command(
+    operation: str,
+    cmd: List[str],
+    cwd: Optional[str] = None,
+    timeout: Optional[float] = None,
+    check: bool = True,
+) -> subprocess.CompletedProcess:
+    # No shell: arguments are passed as they are, stdin is closed so git never waits for credentials
+    timeout = timeout or command_timeout()
+    with tracer.span(operation, kind=SUBPROCESS, operation=operation) as span:
+        try:
+            result = subprocess.run(
+                cmd, cwd=cwd, capture_output=True, text=True, timeout=timeout, stdin=subprocess.DEVNULL
+            )
+        except subprocess.TimeoutExpired:
+            span.set(timeout=timeout)
+            raise CommandTimeoutException(operation, timeout)
+        span.set(exit_code=result.returncode)
+        output = redact(f"{result.stdout}{result.stderr}".strip())
+        if result.returncode != 0:
+            span.status = "error"
+            output and logging.error(output)
+            if check:
+                raise CommandFailedException(operation, result.returncode)
+        elif output:
+            logging.debug(output)
+        return result
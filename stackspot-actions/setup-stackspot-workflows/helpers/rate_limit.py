@@ -0,0 +1,170 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+from helpers.retry import header_float, retry_after
+
+LIMIT_HEADERS = ("X-RateLimit-Limit", "RateLimit-Limit")
+REMAINING_HEADERS = ("X-RateLimit-Remaining", "RateLimit-Remaining")
+RESET_HEADERS = ("X-RateLimit-Reset", "RateLimit-Reset")
+CREDENTIAL_PARAMS = ("private_token", "access_token")
+
+
+def _reset_in(reset: float) -> float:
+    # GitHub, GitLab and Azure send an epoch timestamp, small values are seconds to wait
+    return max(reset - time.time(), 0.0) if reset > 1e9 else max(reset, 0.0)
+
+
+def credential_fingerprint(headers: Optional[dict], params: Optional[dict]) -> str:
+    credential = ""
+    for name, value in (headers or {}).items():
+        if name.lower() == "authorization":
+            credential = value
+    for name in CREDENTIAL_PARAMS:
+        if (params or {}).get(name):
+            credential = params[name]
+    return hashlib.sha256(str(credential).encode()).hexdigest()[:12] if credential else "anonymous"
+
+
+@dataclass
+class RateBudget:
+    limit: Optional[float] = None
+    remaining: Optional[float] = None
+    reset_at: Optional[float] = None
+    next_slot: float = 0.0
+    in_flight: int = 0
+    waited: float = 0.0
+    throttled: int = 0
+
+    def _refill(self, now: float):
+        if self.reset_at is not None and now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = None
+
+    def reserve(self, now: float, pace_below: float) -> float:
+        self._refill(now)
+        self.in_flight += 1
+        if self.remaining is None or self.reset_at is None:
+            return 0.0
+        if self.remaining < 1:
+            delay = self.reset_at - now
+        elif self.limit and self.remaining > self.limit * pace_below:
+            delay = 0.0
+        else:
+            # Spread the remaining budget evenly until the window resets
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + (self.reset_at - now) / self.remaining
+            delay = slot - now
+        self.remaining = max(self.remaining - 1, 0)
+        return delay
+
+    def observe(self, response: requests.Response, now: float):
+        limit = header_float(response, *LIMIT_HEADERS)
+        remaining = header_float(response, *REMAINING_HEADERS)
+        reset = header_float(response, *RESET_HEADERS)
+        self.in_flight = max(self.in_flight - 1, 0)
+        if limit is not None:
+            self.limit = limit
+        if remaining is not None:
+            # Requests still in flight were reserved locally but are not counted by the server yet
+            self.remaining = max(remaining - self.in_flight, 0)
+            if self.limit is None or remaining > self.limit:
+                self.limit = remaining
+        if reset is not None:
+            self.reset_at = now + _reset_in(reset)
+        if response.status_code in (403, 429):
+            wait = retry_after(response)
+            if wait is not None:
+                self.remaining = 0
+                self.reset_at = now + wait
+                self.limit = self.limit or 1
+        # Bitbucket only warns once the budget is almost spent
+        if response.headers.get("X-RateLimit-NearLimit", "").lower() == "true" and self.reset_at is None:
+            self.remaining = min(self.remaining or 1, 1)
+            self.reset_at = now + 60
+
+    def metrics(self, now: float) -> Dict[str, float]:
+        return dict(
+            limit=self.limit,
+            remaining=self.remaining,
+            reset_in=round(self.reset_at - now, 3) if self.reset_at is not None else None,
+            throttled=self.throttled,
+            waited=round(self.waited, 3),
+        )
+
+
+class RateLimiter:
+    def __init__(self, enabled: bool = True, pace_below: float = 0.2, max_wait: float = 300.0):
+        self.enabled = enabled
+        self.pace_below = pace_below
+        self.max_wait = max_wait
+        self.budgets: Dict[Tuple[str, str], RateBudget] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            enabled=os.getenv("HTTP_RATE_LIMIT_PACING", "True") != "False",
+            pace_below=float(os.getenv("HTTP_RATE_LIMIT_PACE_BELOW") or 0.2),
+            max_wait=float(os.getenv("HTTP_RETRY_MAX_WAIT") or 300.0),
+        )
+
+    def _budget(self, key: Tuple[str, str]) -> RateBudget:
+        budget = self.budgets.get(key)
+        if budget is None:
+            budget = self.budgets[key] = RateBudget()
+        return budget
+
+    @staticmethod
+    def key(url: str, headers: Optional[dict] = None, params: Optional[dict] = None) -> Tuple[str, str]:
+        return urlsplit(url).netloc, credential_fingerprint(headers, params)
+
+    def reserve(self, key: Tuple[str, str]) -> float:
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            budget = self._budget(key)
+            delay = min(budget.reserve(time.monotonic(), self.pace_below), self.max_wait)
+            if delay > 0:
+                budget.throttled += 1
+                budget.waited += delay
+        if delay > 0:
+            logging.info(f"Rate limit budget for {key[0]} is low, waiting {delay:.1f}s...")
+        return delay
+
+    def acquire(self, key: Tuple[str, str]) -> float:
+        delay = self.reserve(key)
+        delay > 0 and time.sleep(delay)
+        return delay
+
+    def update(self, key: Tuple[str, str], response: requests.Response):
+        with self._lock:
+            self._budget(key).observe(response, time.monotonic())
+
+    def release(self, key: Tuple[str, str]):
+        with self._lock:
+            budget = self._budget(key)
+            budget.in_flight = max(budget.in_flight - 1, 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                f"{host} ({credential})": budget.metrics(now)
+                for (host, credential), budget in self.budgets.items()
+                if budget.remaining is not None
+            }
+
+    def log_budgets(self):
+        for name, metrics in self.snapshot().items():
+            logging.info(
+                f"Rate limit budget for {name}: {metrics['remaining']:.0f}/{metrics['limit']:.0f} remaining, "
+                f"throttled {metrics['throttled']} times for {metrics['waited']:.1f}s"
+            )
@@ -0,0 +1,86 @@
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import FrozenSet, Optional
+
+import requests
+
+# Methods safe to repeat whatever happened to the first attempt
+IDEMPOTENT_METHODS = frozenset({"get", "head", "put", "delete"})
+
+
+def header_float(response: requests.Response, *names: str) -> Optional[float]:
+    for name in names:
+        value = response.headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except ValueError:
+            continue
+    return None
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+def rate_limit_reset(response: requests.Response) -> Optional[float]:
+    remaining = header_float(response, "X-RateLimit-Remaining", "RateLimit-Remaining")
+    reset = header_float(response, "X-RateLimit-Reset", "RateLimit-Reset")
+    if remaining is None or remaining > 0 or reset is None:
+        return None
+    # GitHub and GitLab send an epoch timestamp, small values are seconds to wait
+    return max(reset - time.time(), 0.0) if reset > 1e9 else reset
+
+
+def is_rate_limited(response: requests.Response) -> bool:
+    if response.status_code == 429:
+        return True
+    # GitHub signals primary and secondary rate limits with a 403
+    return response.status_code == 403 and (
+        "Retry-After" in response.headers or response.headers.get("X-RateLimit-Remaining") == "0"
+    )
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 4
+    backoff: float = 1.0
+    max_backoff: float = 30.0
+    jitter: float = 0.25
+    max_wait: float = 300.0
+    retry_statuses: FrozenSet[int] = field(default_factory=lambda: frozenset({500, 502, 503, 504}))
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=int(os.getenv("HTTP_RETRY_ATTEMPTS") or cls.max_attempts),
+            backoff=float(os.getenv("HTTP_RETRY_BACKOFF") or cls.backoff),
+            max_wait=float(os.getenv("HTTP_RETRY_MAX_WAIT") or cls.max_wait),
+        )
+
+    def backoff_delay(self, attempt: int) -> float:
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        server_delay = None
+        if response is not None:
+            server_delay = retry_after(response)
+            if server_delay is None:
+                server_delay = rate_limit_reset(response)
+        if server_delay is not None:
+            return min(server_delay, self.max_wait)
+        return self.backoff_delay(attempt)
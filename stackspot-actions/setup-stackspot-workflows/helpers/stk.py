@@ -1,36 +1,64 @@
+import hashlib
+import json
 import logging
-import subprocess
 import os
 import sys
 import shutil
+import tempfile
+import threading
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 from helpers import util
 from helpers.exceptions import ApplyPluginSetupRepositoryException
+from helpers.template_renderer import render_plugin
+from helpers.tracing import traced_run, tracer
 
 
 stk = sys.argv[0]
+PLUGIN_ALIAS = "setup-scm"
+# Path and sha256 of every generated file, committed with them
+GENERATED_MANIFEST = ".stackspot-workflows.json"
 
 
 class Stk:
+    def __init__(self, render_cache: Optional[bool] = None):
+        # The rendered files only depend on the plugin and the provider, stk apply runs once for all the targets
+        self.render_cache = os.getenv("STK_RENDER_CACHE", "True") != "False" if render_cache is None else render_cache
+        self.renders: Dict[str, Tuple[Path, Dict[str, str]]] = {}
+        self._staging: Optional[tempfile.TemporaryDirectory] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def home() -> Path:
+        stk_binary_name = Path(stk).stem
+        return Path.home() / f".{stk_binary_name}"
+
     @property
     def is_using_workspace(self) -> bool:
-        home_path = Path.home()
-        stk_binary_name = Path(stk).stem
-        stk_folder = Path(home_path) / f".{stk_binary_name}"
-        workspace_config_path = stk_folder / "workspaces" / "workspace-config.json"
+        workspace_config_path = Stk.home() / "workspaces" / "workspace-config.json"
         return workspace_config_path.exists()
 
     @staticmethod
     def exit_workspace():
         exit_workspace_cmd = [stk, "exit", "workspace"]
-        subprocess.run(exit_workspace_cmd)
+        traced_run("stk exit workspace", exit_workspace_cmd)
+
+    def create_workflow_files(self, component_path: str, provider: str, workdir: str) -> bool:
+        logging.info("Creating workflow files...")
+        if self.render_cache:
+            return Stk.materialize(*self.rendered(component_path, provider), workdir)
+        with tempfile.TemporaryDirectory(prefix="stk-render-") as staging:
+            Stk.apply_plugin(component_path, provider, staging)
+            return Stk.materialize(Path(staging), Stk.file_digests(Path(staging)), workdir)
 
     @staticmethod
-    def create_workflow_files(component_path: str, provider: str):
+    def apply_plugin(component_path: str, provider: str, workdir: str):
+        if os.getenv("STK_NATIVE_RENDER", "True") != "False":
+            with tracer.span("render templates"):
+                if render_plugin(component_path, dict(provider=provider), workdir) is not None:
+                    return
         try:
-            logging.info("Creating workflow files...")
-            Stk.remove_all_files_generated_on_apply_plugin(component_path, provider)
             stk_apply_plugin_cmd = [
                 stk,
                 "apply",
@@ -40,27 +68,123 @@ class Stk:
                 "--provider",
                 provider,
                 "--alias",
-                "setup-scm"
+                PLUGIN_ALIAS
             ]
-            result = subprocess.run(stk_apply_plugin_cmd)
+            result = traced_run("stk apply plugin", stk_apply_plugin_cmd, cwd=workdir)
             if result.returncode != 0:
                 raise ApplyPluginSetupRepositoryException()
         finally:
-            shutil.rmtree(".stk", onerror=util.on_delete_error, ignore_errors=True)
+            shutil.rmtree(Path(workdir) / ".stk", onerror=util.on_delete_error, ignore_errors=True)
+
+    def rendered(self, component_path: str, provider: str) -> Tuple[Path, Dict[str, str]]:
+        key = Stk.render_key(component_path, provider)
+        with self._lock:
+            render = self.renders.get(key)
+            if render is not None:
+                logging.info("Reusing the workflow files rendered for a previous target.")
+                return render
+            if self._staging is None:
+                self._staging = tempfile.TemporaryDirectory(prefix="stk-render-")
+            staging = Path(self._staging.name) / key
+            staging.mkdir()
+            try:
+                Stk.apply_plugin(component_path, provider, str(staging))
+            except BaseException:
+                shutil.rmtree(staging, onerror=util.on_delete_error, ignore_errors=True)
+                raise
+            # Read only: the working trees share the staged files through hardlinks
+            for path in staging.rglob("*"):
+                path.is_file() and path.chmod(path.stat().st_mode & ~0o222)
+            render = self.renders[key] = (staging, Stk.file_digests(staging))
+            return render
+
+    @staticmethod
+    def render_key(component_path: str, provider: str) -> str:
+        digest = hashlib.sha256()
+        plugin_path = Path(component_path) / "plugin.yaml"
+        if plugin_path.exists():
+            digest.update(plugin_path.read_bytes())
+        digest.update(f"{Stk.templates_digest(component_path, provider)}:{provider}:{PLUGIN_ALIAS}".encode())
+        return digest.hexdigest()[:16]
 
     @staticmethod
-    def remove_all_files_generated_on_apply_plugin(component_path: str, provider: str):
+    def file_digest(path: Path) -> str:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+
+    @staticmethod
+    def file_digests(root: Path) -> Dict[str, str]:
+        return {
+            path.relative_to(root).as_posix(): Stk.file_digest(path) for path in sorted(root.rglob("*")) if path.is_file()
+        }
+
+    @staticmethod
+    def generated_manifest(content: Optional[bytes]) -> Dict[str, str]:
+        try:
+            return json.loads(content).get("files", {}) if content else {}
+        except (ValueError, AttributeError):
+            return {}
+
+    @staticmethod
+    def manifest_content(digests: Dict[str, str]) -> bytes:
+        return (json.dumps(dict(files=digests), indent=2, sort_keys=True) + "\n").encode()
+
+    @staticmethod
+    def materialize(staging: Path, digests: Dict[str, str], workdir: str) -> bool:
+        # Only the entries that differ from the working tree are written, files listed by the manifest of a previous
+        # run that the plugin no longer renders are removed. Returns whether anything changed
+        root = Path(workdir).resolve()
+        manifest_path = root / GENERATED_MANIFEST
+        current_manifest = manifest_path.read_bytes() if manifest_path.is_file() else None
+        changed = False
+        for path in Stk.generated_manifest(current_manifest).keys() - digests.keys():
+            stale = (root / path).resolve()
+            if root in stale.parents and stale.is_file():
+                logging.info(f"Removing {path}, no longer generated by the plugin")
+                stale.unlink()
+                changed = True
+        for path, digest in digests.items():
+            target = root / path
+            if target.is_file() and Stk.file_digest(target) == digest:
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.unlink(missing_ok=True)
+            try:
+                os.link(staging / path, target)
+            except OSError:
+                shutil.copy2(staging / path, target)
+            changed = True
+        manifest = Stk.manifest_content(digests)
+        if manifest != current_manifest:
+            manifest_path.write_bytes(manifest)
+            changed = True
+        return changed
+
+    @staticmethod
+    def workflow_template_files(component_path: str, provider: str) -> List[Path]:
         workflow_template_provider_path = (
                 Path(component_path) / "workflow-templates" / provider.lower()
         )
-        workdir = os.getcwd()
-        for subdir, dirs, files in os.walk(workflow_template_provider_path):
-            for file in files:
+        files = []
+        for subdir, dirs, filenames in os.walk(workflow_template_provider_path):
+            for file in filenames:
                 file_to_be_applied_path = Path(os.path.join(subdir, file))
-                relative_path_file_to_be_applied = file_to_be_applied_path.relative_to(
-                    workflow_template_provider_path
-                )
+                files.append(file_to_be_applied_path.relative_to(workflow_template_provider_path))
+        return files
 
-                file_path = Path(workdir) / relative_path_file_to_be_applied
-                if file_path.exists():
-                    file_path.unlink(missing_ok=True)
+    @staticmethod
+    def templates_digest(component_path: str, provider: str) -> str:
+        templates_path = Path(component_path) / "workflow-templates" / provider.lower()
+        digest = hashlib.sha256()
+        for file in sorted(Stk.workflow_template_files(component_path, provider)):
+            digest.update(file.as_posix().encode() + b"\0")
+            digest.update((templates_path / file).read_bytes())
+        return digest.hexdigest()[:12]
+
+    @staticmethod
+    def workflow_template_dirs(component_path: str, provider: str) -> List[str]:
+        dirs = {
+            file.parent.as_posix()
+            for file in Stk.workflow_template_files(component_path, provider)
+            if file.parent != Path(".")
+        }
+        return sorted(dirs)
@@ -0,0 +1,120 @@
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PLUGIN_MANIFEST = "plugin.yaml"
+RENDER_TEMPLATES_HOOK = "render-templates"
+AFTER_RENDER = "after-render"
+# Folder the plugin renders by itself, besides its hooks
+PLUGIN_TEMPLATES_DIR = "templates"
+
+TAG_START = re.compile(r"\{[{%#]")
+RAW_BEGIN = re.compile(r"\{%(-?)\s*raw\s*(-?)%\}")
+RAW_END = re.compile(r"\{%(-?)\s*endraw\s*(-?)%\}")
+VARIABLE = re.compile(r"\{\{(-?)\s*([A-Za-z_]\w*)\s*(-?)\}\}")
+COMMENT = re.compile(r"\{#(-?).*?(-?)#\}", re.S)
+CONDITIONS = {"==": lambda value, expected: value == expected, "!=": lambda value, expected: value != expected}
+
+
+class UnsupportedTemplate(Exception):
+    pass
+
+
+def render(text: str, inputs: Dict[str, str], keep_trailing_newline: bool = False) -> str:
+    # Jinja subset: raw blocks, comments and plain variables, with the default settings of jinja (no trim_blocks,
+    # the last newline of the template is dropped)
+    if text.endswith("\n") and not keep_trailing_newline:
+        text = text[:-1]
+    parts: List[str] = []
+    position = 0
+    strip_next = False
+    while True:
+        match = TAG_START.search(text, position)
+        literal = text[position:match.start() if match else len(text)]
+        parts.append(literal.lstrip() if strip_next else literal)
+        if match is None:
+            break
+        tag = text[match.start():match.start() + 2]
+        if tag == "{%":
+            begin = RAW_BEGIN.match(text, match.start())
+            end = begin and RAW_END.search(text, begin.end())
+            if not end:
+                raise UnsupportedTemplate(f"statement {text[match.start():match.start() + 30]!r}")
+            content = text[begin.end():end.start()]
+            content = content.lstrip() if begin.group(2) else content
+            content = content.rstrip() if end.group(1) else content
+            left_strip, strip_next, value, position = begin.group(1), bool(end.group(2)), content, end.end()
+        elif tag == "{{":
+            variable = VARIABLE.match(text, match.start())
+            if not variable or variable.group(2) not in inputs:
+                raise UnsupportedTemplate(f"expression {text[match.start():match.start() + 30]!r}")
+            left_strip, value, position = variable.group(1), str(inputs[variable.group(2)]), variable.end()
+            strip_next = bool(variable.group(3))
+        else:
+            comment = COMMENT.match(text, match.start())
+            if not comment:
+                raise UnsupportedTemplate("unterminated comment")
+            left_strip, value, position = comment.group(1), "", comment.end()
+            strip_next = bool(comment.group(2))
+        if left_strip:
+            parts[-1] = parts[-1].rstrip()
+        parts.append(value)
+    return "".join(parts)
+
+
+def _load_manifest(component_path: Path) -> dict:
+    manifest_path = component_path / PLUGIN_MANIFEST
+    if not manifest_path.exists():
+        raise UnsupportedTemplate(f"no {PLUGIN_MANIFEST}")
+    try:
+        import yaml
+    except ImportError:
+        raise UnsupportedTemplate("PyYAML is not installed")
+    return yaml.safe_load(manifest_path.read_text()) or {}
+
+
+def _hook_applies(hook: dict, inputs: Dict[str, str]) -> bool:
+    condition = hook.get("condition")
+    if not condition:
+        return True
+    check = CONDITIONS.get(condition.get("operator"))
+    if check is None:
+        raise UnsupportedTemplate(f"condition operator {condition.get('operator')}")
+    return check(inputs.get(condition.get("variable")), condition.get("value"))
+
+
+def render_files(component_path: str, inputs: Dict[str, str]) -> Dict[str, bytes]:
+    root = Path(component_path)
+    spec = _load_manifest(root).get("spec") or {}
+    if (root / PLUGIN_TEMPLATES_DIR).exists():
+        raise UnsupportedTemplate(f"{PLUGIN_TEMPLATES_DIR} folder")
+    inputs = dict({
+        plugin_input["name"]: plugin_input["default"] for plugin_input in spec.get("inputs") or [] if "default" in plugin_input
+    }, **inputs)
+    files = {}
+    for hook in spec.get("hooks") or []:
+        if hook.get("type") != RENDER_TEMPLATES_HOOK or hook.get("trigger") != AFTER_RENDER:
+            raise UnsupportedTemplate(f"{hook.get('trigger')} {hook.get('type')} hook")
+        if not _hook_applies(hook, inputs):
+            continue
+        templates_path = root / hook["path"]
+        for template in sorted(templates_path.rglob("*")):
+            if template.is_file():
+                path = render(template.relative_to(templates_path).as_posix(), inputs, keep_trailing_newline=True)
+                files[path] = render(template.read_text(), inputs).encode()
+    return files
+
+
+def render_plugin(component_path: str, inputs: Dict[str, str], workdir: str) -> Optional[List[str]]:
+    # Every file is rendered before anything is written, an unsupported template leaves the workdir untouched
+    try:
+        files = render_files(component_path, inputs)
+    except (UnsupportedTemplate, UnicodeDecodeError) as e:
+        logging.info(f"Native template rendering not possible ({e}), using stk apply plugin.")
+        return None
+    for path, content in files.items():
+        target = Path(workdir) / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(content)
+    return list(files)
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import secrets
+import subprocess
+import threading
+from contextvars import ContextVar
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SERVICE_NAME = "setup-stackspot-workflows"
+
+STAGE = "stage"
+HTTP = "http"
+SUBPROCESS = "subprocess"
+GIT = "git"
+
+# OpenTelemetry span kinds: stages are internal work, http, subprocesses and in process git are calls to someone else
+OTLP_KINDS = {STAGE: 1, HTTP: 3, SUBPROCESS: 3, GIT: 3}
+OTLP_STATUS = {"ok": 1, "error": 2}
+
+
+@dataclass
+class Span:
+    name: str
+    kind: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    status: str = "ok"
+    attributes: Dict = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(percentile / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class Tracer:
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        # Context local: every thread and every asyncio task sees its own parent span
+        self._stack: ContextVar[Tuple[Span, ...]] = ContextVar("stack", default=())
+
+    @contextmanager
+    def span(self, name: str, kind: str = STAGE, **attributes) -> Iterator[Span]:
+        stack = self._stack.get()
+        span = Span(
+            name=name,
+            kind=kind,
+            trace_id=self.trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=stack[-1].span_id if stack else None,
+            start_ns=time.time_ns(),
+            attributes=dict(attributes),
+        )
+        token = self._stack.set(stack + (span,))
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            self._stack.reset(token)
+            with self._lock:
+                self.spans.append(span)
+
+    def finished_spans(self) -> List[Span]:
+        with self._lock:
+            return list(self.spans)
+
+    def export_jsonl(self, path: str):
+        with open(path, "a") as file:
+            for span in self.finished_spans():
+                file.write(json.dumps(dict(asdict(span), duration=span.duration)) + "\n")
+
+    def export_otlp(self, path: str):
+        spans = [
+            {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "kind": OTLP_KINDS.get(span.kind, 1),
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)}
+                    for key, value in dict(span.attributes, **{"span.kind": span.kind}).items()
+                ],
+                "status": {"code": OTLP_STATUS[span.status]},
+            }
+            for span in self.finished_spans()
+        ]
+        document = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                    "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": spans}],
+                }
+            ]
+        }
+        with open(path, "w") as file:
+            json.dump(document, file)
+
+    def export_from_env(self):
+        path = os.getenv("STK_TRACE_FILE")
+        if not path:
+            return
+        if os.getenv("STK_TRACE_FORMAT", "jsonl") == "otlp":
+            self.export_otlp(path)
+        else:
+            self.export_jsonl(path)
+        logging.info(f"Trace written to {path}")
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        durations = defaultdict(list)
+        for span in self.finished_spans():
+            key = span.name if span.kind == STAGE else f"{span.kind}: {span.attributes.get('operation', span.name)}"
+            durations[key].append(span.duration)
+        return {
+            key: dict(
+                count=len(values),
+                total=sum(values),
+                p50=_percentile(values, 50),
+                p95=_percentile(values, 95),
+                max=max(values),
+            )
+            for key, values in durations.items()
+        }
+
+    def log_breakdown(self):
+        breakdown = self.breakdown()
+        if not breakdown:
+            return
+        logging.info("Latency breakdown (seconds):")
+        logging.info(f"{'operation':<40} {'count':>6} {'total':>9} {'p50':>8} {'p95':>8} {'max':>8}")
+        for key, stats in sorted(breakdown.items(), key=lambda item: item[1]["total"], reverse=True):
+            logging.info(
+                f"{key[:40]:<40} {stats['count']:>6} {stats['total']:>9.2f} {stats['p50']:>8.2f} {stats['p95']:>8.2f} {stats['max']:>8.2f}"
+            )
+
+
+tracer = Tracer()
+
+
+def traced_run(operation: str, cmd, **kwargs) -> subprocess.CompletedProcess:
+    with tracer.span(operation, kind=SUBPROCESS, operation=operation) as span:
+        result = subprocess.run(cmd, **kwargs)
+        span.set(exit_code=result.returncode)
+        if result.returncode != 0:
+            span.status = "error"
+        return result
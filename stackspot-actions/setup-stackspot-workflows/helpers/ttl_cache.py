@@ -0,0 +1,34 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class TtlCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self.entries.pop(key, None)
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value):
+        with self._lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_set(self, key: Hashable, load: Callable[[], Any]):
+        # None results are not kept, a missing resource may be created by the next caller
+        value = self.get(key)
+        if value is None:
+            value = load()
+            value is not None and self.set(key, value)
+        return value
@@ -0,0 +1,32 @@
+import logging
+import random
+import time
+from typing import Callable
+
+from helpers.exceptions import ResourceNotReadyException
+
+
+def wait_until_ready(
+    is_ready: Callable[[], bool],
+    resource: str,
+    timeout: float = 60.0,
+    initial_delay: float = 0.5,
+    max_delay: float = 8.0,
+    factor: float = 2.0,
+    jitter: float = 0.25,
+) -> float:
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = initial_delay
+    checks = 0
+    while True:
+        checks += 1
+        if is_ready():
+            elapsed = time.monotonic() - start
+            logging.info(f"{resource} ready after {elapsed:.2f}s ({checks} checks)")
+            return elapsed
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ResourceNotReadyException(resource=resource, timeout=timeout)
+        time.sleep(min(delay * random.uniform(1 - jitter, 1 + jitter), remaining))
+        delay = min(delay * factor, max_delay)
@@ -1,16 +1,19 @@
 import logging
-import time
 from typing import Protocol
 
 import requests
 
 from azure.azure_provider import AzureProvider
+from batch import BatchManifest, load_manifest, log_summary, plan_batch, run_batch
 from helpers.exceptions import ActionException
+from helpers.dulwich_git import DulwichGit
 from helpers.git_helper import Git
 from github.github_provider import GithubProvider
 from gitlab.gitlab_provider import GitlabProvider
 from bitbucket.bitbucket_provider import BitbucketProvider
 from helpers.http_client import HttpClient
+from helpers.tracing import tracer
+from plan import Plan
 from provider import Provider
 from setup import setup
 from helpers.stk import Stk
@@ -18,6 +21,7 @@ from helpers.stk import Stk
 logging.basicConfig(format="%(message)s", level=logging.INFO)
 
 PROVIDERS = dict(Azure=AzureProvider, Github=GithubProvider, Gitlab=GitlabProvider, Bitbucket=BitbucketProvider)
+GIT_BACKENDS = dict(git=Git, dulwich=DulwichGit)
 
 
 class Metadata(Protocol):
@@ -27,10 +31,12 @@ class Metadata(Protocol):
 
 
 def extra_inputs(metadata: Metadata):
+    # Same templates, same branch: a rerun updates the branch and pull request of the previous one
+    digest = Stk.templates_digest(metadata.component_path, metadata.inputs["provider"])
     return dict(
         component_path=metadata.component_path,
         target_path=metadata.target_path,
-        ref_branch=f"setup-scm-{str(time.time())}"
+        ref_branch=f"setup-scm-{digest}"
     )
 
 
@@ -39,18 +45,38 @@ def run(metadata: Metadata):
     try:
         kwargs = dict(
             stk=Stk(),
-            git=Git(),
-            http_client=HttpClient(),
+            git=GIT_BACKENDS[metadata.inputs.get("git_backend") or "git"](),
+            http_client=HttpClient.default(),
             **metadata.inputs,
             **extra_inputs(metadata)
         )
         provider_name = metadata.inputs.get("provider")
-        provider: Provider = PROVIDERS[provider_name](**kwargs)
-        setup(provider)
+        manifest_path = metadata.inputs.get("manifest")
+        plan_path = metadata.inputs.get("plan")
+        apply_plan_path = metadata.inputs.get("apply_plan")
+        plan = Plan.load(apply_plan_path) if apply_plan_path else None
+        if plan_path:
+            # A single target is planned as a manifest of one target built from the inputs
+            manifest = load_manifest(manifest_path) if manifest_path else BatchManifest(targets=[dict()], options=dict())
+            plan = plan_batch(PROVIDERS[provider_name], manifest, **kwargs)
+            plan.save(plan_path)
+            plan.log_summary()
+            logging.info(f"Plan saved to {plan_path}, apply it with the apply_plan input.")
+        elif manifest_path:
+            entries = run_batch(PROVIDERS[provider_name], load_manifest(manifest_path), plan=plan, **kwargs)
+            log_summary(entries)
+        else:
+            provider: Provider = PROVIDERS[provider_name](**kwargs)
+            setup(provider, plan=plan and plan.target_plan(provider.target_name, provider.inputs.ref_branch))
     except requests.HTTPError:
         logging.error("A failure with a important request happened")
     except ActionException as e:
         logging.error(e.msg)
     except Exception as e:
         logging.exception(e)
+    HttpClient.default().log_connection_stats()
+    HttpClient.default().log_rate_limits()
+    HttpClient.default().log_cache_stats()
+    tracer.log_breakdown()
+    tracer.export_from_env()
     logging.info("Exit!")
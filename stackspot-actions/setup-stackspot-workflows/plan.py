@@ -0,0 +1,97 @@
+import json
+import logging
+import shutil
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from helpers import util
+from helpers.exceptions import PlanMismatchException
+from helpers.tracing import tracer
+from provider import (
+    COMMIT_FILES,
+    CREATE_HOOK,
+    CREATE_PIPELINE,
+    CREATE_PROJECT,
+    CREATE_REPOSITORY,
+    CREATE_TRIGGER,
+    ENABLE_PIPELINE,
+    OPEN_PULL_REQUEST,
+    UPDATE_HOOK,
+    Provider,
+)
+
+# Setup stages and the planned actions that need them, the other stages always run
+STAGE_ACTIONS = {
+    "create_project": {CREATE_PROJECT},
+    "create_repository": {CREATE_REPOSITORY},
+    "save_files_repository": {COMMIT_FILES, OPEN_PULL_REQUEST},
+    "extra_setup": {CREATE_HOOK, UPDATE_HOOK, CREATE_PIPELINE, CREATE_TRIGGER, ENABLE_PIPELINE},
+}
+
+
+@dataclass
+class TargetPlan:
+    target: str
+    actions: List[str] = field(default_factory=list)
+    facts: Dict[str, Any] = field(default_factory=dict)
+    state: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def needs(self, stage: str) -> bool:
+        return stage not in STAGE_ACTIONS or bool(STAGE_ACTIONS[stage] & set(self.actions))
+
+
+@dataclass
+class Plan:
+    provider: str
+    ref_branch: str
+    targets: List[TargetPlan]
+
+    def save(self, path: str):
+        Path(path).write_text(json.dumps(asdict(self), indent=2))
+
+    @classmethod
+    def load(cls, path: str) -> "Plan":
+        plan_path = Path(path)
+        if not plan_path.exists():
+            raise PlanMismatchException(f"Plan {path} not found")
+        data = json.loads(plan_path.read_text())
+        return cls(
+            provider=data["provider"],
+            ref_branch=data["ref_branch"],
+            targets=[TargetPlan(**target) for target in data["targets"]],
+        )
+
+    def target_plan(self, target: str, ref_branch: str) -> TargetPlan:
+        # The branch is named after the templates, another one means the planned files changed since
+        if ref_branch != self.ref_branch:
+            raise PlanMismatchException(f"Plan was made for branch {self.ref_branch}, templates changed since, plan again")
+        for target_plan in self.targets:
+            if target_plan.target == target:
+                if target_plan.error:
+                    raise PlanMismatchException(f"Target {target} could not be planned: {target_plan.error}")
+                return target_plan
+        raise PlanMismatchException(f"Target {target} is not part of the plan")
+
+    def log_summary(self):
+        logging.info("...")
+        counter = Counter(action for target_plan in self.targets for action in target_plan.actions)
+        summary = ", ".join(f"{count} {action}" for action, count in sorted(counter.items()))
+        logging.info(f"Plan for {len(self.targets)} targets: {summary or 'nothing to do'}")
+        for target_plan in self.targets:
+            if target_plan.error:
+                logging.info(f"[FAILED] {target_plan.target}: {target_plan.error}")
+            else:
+                logging.info(f"[{'CHANGE' if target_plan.actions else 'OK'}] {target_plan.target}: {', '.join(target_plan.actions) or 'up to date'}")
+        logging.info("...")
+
+
+def plan_target(provider: Provider) -> TargetPlan:
+    try:
+        with tracer.span("plan", target=provider.target_name):
+            actions = provider.plan()
+        return TargetPlan(target=provider.target_name, actions=actions, facts=provider.facts, state=provider.checkpoint())
+    finally:
+        shutil.rmtree(provider.workdir, onerror=util.on_delete_error, ignore_errors=True)
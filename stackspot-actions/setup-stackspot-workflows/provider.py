@@ -1,25 +1,85 @@
 import logging
+import os
+import shutil
 import tempfile
-import time
+import threading
 from abc import ABC, abstractmethod
-from typing import Optional
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Any, Callable, Dict, List, Optional
 
 from questionary import confirm
 
-from helpers.exceptions import RepositoryNeedsToExists
-from helpers.git_helper import Git
+from helpers import util
+from helpers.exceptions import CloningRepoException, RepositoryNeedsToExists
+from helpers.git_helper import CloneMode, Git
+from helpers.git_mirror import MirrorCache
+from helpers.wait import wait_until_ready
 from inputs import Inputs
-from helpers.stk import Stk
+from helpers.stk import GENERATED_MANIFEST, Stk
+
+_prompt_lock = threading.RLock()
+
+GIT_SAVE_STRATEGY = "git"
+API_SAVE_STRATEGY = "api"
+
+# Actions a plan may ask for
+CREATE_PROJECT = "create_project"
+CREATE_REPOSITORY = "create_repository"
+COMMIT_FILES = "commit_files"
+OPEN_PULL_REQUEST = "open_pull_request"
+CREATE_HOOK = "create_hook"
+UPDATE_HOOK = "update_hook"
+CREATE_PIPELINE = "create_pipeline"
+CREATE_TRIGGER = "create_trigger"
+ENABLE_PIPELINE = "enable_pipeline"
+
+# Facts read while planning, batched reads fill them for many targets at once
+PROJECT_EXISTS = "project_exists"
+REPOSITORY_EXISTS = "repository_exists"
+MAIN_HEAD = "main_head"
+CHANGED_FILES = "changed_files"
+PULL_REQUEST = "pull_request"
+
+
+@dataclass(frozen=True)
+class FileChange:
+    path: str
+    # None removes the file
+    content: Optional[bytes]
+    exists: bool
 
 
 class Provider(ABC):
+    # Concurrent I/O stages allowed by default in a batch, keeps us below each SCM abuse/secondary rate limits
+    MAX_IO_CONCURRENCY = 4
+    READINESS_TIMEOUT = 60.0
     inputs: Inputs
 
-    def __init__(self, stk: Stk, git: Git):
+    def __init__(self, stk: Stk, git: Git, **kwargs):
         self.stk = stk
         self.git = git
         self.workdir = tempfile.mkdtemp()
         self.repo_created = False
+        self.files_changed = True
+        self.assume_yes = bool(kwargs.get("assume_yes"))
+        self.clone_mode = CloneMode(kwargs["clone_mode"]) if kwargs.get("clone_mode") else None
+        self.save_strategy = kwargs.get("save_strategy") or GIT_SAVE_STRATEGY
+        self.mirror_cache = kwargs.get("mirror_cache") or MirrorCache.from_env()
+        self.base_commit: Optional[str] = None
+        self.facts: Dict[str, Any] = {}
+
+    @property
+    @abstractmethod
+    def target_name(self) -> str:
+        ...
+
+    def confirm(self, message: str) -> bool:
+        if self.assume_yes:
+            logging.info(f"{message} yes (assumed)")
+            return True
+        with _prompt_lock:
+            return confirm(message=message).unsafe_ask()
 
     @abstractmethod
     def extra_setup(self):
@@ -42,19 +102,69 @@ class Provider(ABC):
     def create_pull_request(self) -> str:
         ...
 
+    @abstractmethod
+    def find_pull_request(self) -> Optional[str]:
+        ...
+
     @property
     @abstractmethod
     def scm_config_url(self) -> str:
         ...
 
+    @classmethod
+    def prefetch(cls, providers: List["Provider"]):
+        # Providers with list or batch endpoints read the facts of many targets with a few requests
+        pass
+
+    def fact(self, name: str, read: Callable[[], Any]) -> Any:
+        if name not in self.facts:
+            self.facts[name] = read()
+        return self.facts[name]
+
+    def project_exists(self) -> bool:
+        return True
+
+    def plan_extra_setup(self, repository_exists: bool) -> List[str]:
+        return []
+
+    def plan(self) -> List[str]:
+        # Read calls only, nothing is created and the workflow files are rendered into the temporary workdir
+        actions = []
+        project_exists = self.fact(PROJECT_EXISTS, self.project_exists)
+        if not project_exists:
+            actions.append(CREATE_PROJECT)
+        repository_exists = project_exists and self.fact(REPOSITORY_EXISTS, self.repo_exists)
+        if not repository_exists:
+            actions.append(CREATE_REPOSITORY)
+        main_head = repository_exists and self.fact(MAIN_HEAD, self.main_head)
+        if main_head:
+            self.create_workflow_manifest()
+            changed_files = self.fact(CHANGED_FILES, lambda: [change.path for change in self.changed_files()])
+            if changed_files:
+                actions.append(COMMIT_FILES)
+                if not self.fact(PULL_REQUEST, self.find_pull_request):
+                    actions.append(OPEN_PULL_REQUEST)
+        else:
+            # Nothing to compare with, the files go straight into main
+            actions.append(COMMIT_FILES)
+        return actions + self.plan_extra_setup(repository_exists)
+
+    def checkpoint(self) -> Dict[str, Any]:
+        # Outputs of the completed stages a resumed run needs, kept in the setup journal
+        return dict(repo_created=self.repo_created)
+
+    def restore(self, checkpoint: Dict[str, Any]):
+        self.repo_created = checkpoint.get("repo_created", self.repo_created)
+
     def validate_environment(self):
-        if self.stk.is_using_workspace:
-            should_exit_workspace = confirm(
-                message="You need to be outside workspace, do you agree to exit current workspace?"
-            ).unsafe_ask()
-            if not should_exit_workspace:
-                raise Exception("Its needed to exit the workspace")
-            self.stk.exit_workspace()
+        with _prompt_lock:
+            if self.stk.is_using_workspace:
+                should_exit_workspace = self.confirm(
+                    message="You need to be outside workspace, do you agree to exit current workspace?"
+                )
+                if not should_exit_workspace:
+                    raise Exception("Its needed to exit the workspace")
+                self.stk.exit_workspace()
 
     def create_project(self):
         ...
@@ -63,37 +173,153 @@ class Provider(ABC):
         if self.repo_exists():
             return
         logging.info("Repository not found!")
-        create_repo = confirm(message="You want to create a new repository?").unsafe_ask()
+        create_repo = self.confirm(message="You want to create a new repository?")
         if create_repo:
             self.execute_repo_creation()
             self.repo_created = True
-            time.sleep(5)
+            wait_until_ready(self.repo_exists, resource="Repository", timeout=self.READINESS_TIMEOUT)
             return
         raise RepositoryNeedsToExists()
 
+    def select_clone_mode(self) -> CloneMode:
+        if self.clone_mode:
+            return self.clone_mode
+        # A new repository has nothing to filter, an existing one only needs the paths the templates write into
+        return CloneMode.SHALLOW if self.repo_created else CloneMode.SPARSE
+
+    @property
+    def commits_through_api(self) -> bool:
+        return self.base_commit is not None
+
+    def main_head(self) -> Optional[str]:
+        # None when main does not exist yet, the files are then pushed with git
+        return self.branch_head("main")
+
+    @abstractmethod
+    def branch_head(self, branch: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def remote_file_content(self, path: str, ref: str = "main") -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def commit_files(self, changes: List[FileChange], branch_head: Optional[str]):
+        ...
+
     def clone_repository(self):
-        self.git.clone(self.clone_url, self.workdir)
+        if self.save_strategy == API_SAVE_STRATEGY:
+            self.base_commit = self.main_head()
+            if self.commits_through_api:
+                logging.info("Skipping clone, workflow files will be committed through the provider api.")
+                return
+            logging.info("Main branch not available through the api, falling back to git.")
+        mode = self.select_clone_mode()
+        sparse_paths = self.stk.workflow_template_dirs(self.inputs.component_path, self.inputs.provider)
+        try:
+            if self.mirror_cache and not self.repo_created:
+                with self.mirror_cache.use(self.clone_url) as mirror:
+                    self.git.clone(self.clone_url, self.workdir, mode=mode, sparse_paths=sparse_paths, reference=str(mirror))
+            else:
+                self.git.clone(self.clone_url, self.workdir, mode=mode, sparse_paths=sparse_paths)
+        except CloningRepoException:
+            if mode == CloneMode.FULL:
+                raise
+            logging.info(f"The {mode.value} clone failed, falling back to a full clone...")
+            shutil.rmtree(self.workdir, onerror=util.on_delete_error, ignore_errors=True)
+            os.makedirs(self.workdir, exist_ok=True)
+            self.git.clone(self.clone_url, self.workdir, mode=CloneMode.FULL)
+            return
+        if mode == CloneMode.SPARSE:
+            # Files of the previous manifest outside the workflow folders must be checked out to be removed
+            self.git.add_sparse_paths(self.generated_dirs(), self.workdir)
+
+    def generated_paths(self) -> List[str]:
+        manifest_path = Path(self.workdir) / GENERATED_MANIFEST
+        return sorted(Stk.generated_manifest(manifest_path.read_bytes() if manifest_path.is_file() else None))
+
+    def generated_dirs(self) -> List[str]:
+        return sorted({str(PurePosixPath(path).parent) for path in self.generated_paths()} - {"."})
 
     def create_workflow_manifest(self):
-        self.stk.create_workflow_files(
+        self.files_changed = self.stk.create_workflow_files(
             component_path=self.inputs.component_path,
-            provider=self.inputs.provider
+            provider=self.inputs.provider,
+            workdir=self.workdir,
         )
 
+    def rendered_files(self) -> Dict[str, bytes]:
+        workdir = Path(self.workdir)
+        return {
+            path.relative_to(workdir).as_posix(): path.read_bytes()
+            for path in workdir.rglob("*")
+            if path.is_file() and path.relative_to(workdir).parts[0] not in (".git", ".stk")
+        }
+
+    def changed_files(self, ref: str = "main") -> List[FileChange]:
+        rendered = self.rendered_files()
+        manifest = rendered.pop(GENERATED_MANIFEST, None)
+        remote_manifest = self.remote_file_content(GENERATED_MANIFEST, ref)
+        # Every file is compared with the ref, a file edited there by hand is restored even when the manifests match
+        changes = [
+            FileChange(path=path, content=None, exists=True)
+            for path in sorted(Stk.generated_manifest(remote_manifest).keys() - rendered.keys())
+            if self.remote_file_content(path, ref) is not None
+        ]
+        for path, content in sorted(rendered.items()):
+            remote_content = self.remote_file_content(path, ref)
+            if remote_content != content:
+                changes.append(FileChange(path=path, content=content, exists=remote_content is not None))
+        if manifest is not None and manifest != remote_manifest:
+            changes.append(FileChange(path=GENERATED_MANIFEST, content=manifest, exists=remote_manifest is not None))
+        return changes
+
+    def save_files_through_api(self) -> Optional[str]:
+        changes = self.changed_files()
+        if not changes:
+            logging.info("Workflow files are up to date.")
+            return None
+        branch_head = self.branch_head(self.inputs.ref_branch)
+        if branch_head:
+            # The setup branch is never rewritten, commits pushed to it are kept and the files go on top of them
+            changes = self.changed_files(ref=self.inputs.ref_branch)
+        if changes:
+            logging.info(f"Committing {len(changes)} files into {self.inputs.ref_branch} through the api...")
+            self.commit_files(changes, branch_head)
+        else:
+            logging.info(f"Workflow files are already in {self.inputs.ref_branch}.")
+        return self.pull_request()
+
+    def pull_request(self) -> str:
+        # The setup branch name only depends on the templates, a previous run may have opened its pull request already
+        pr_link = self.find_pull_request()
+        if pr_link:
+            logging.info(f"Pull request of {self.inputs.ref_branch} is already open, reusing it.")
+            return pr_link
+        return self.create_pull_request()
+
     def save_files_repository(self) -> Optional[str]:
+        if self.commits_through_api:
+            return self.save_files_through_api()
+        if not self.files_changed:
+            logging.info("Workflow files are up to date.")
+            return None
         working_branch = "main"
-        self.git.init()
-        if self.git.main_exists():
-            self.git.checkout(self.inputs.ref_branch)
+        if self.git.main_exists(self.workdir):
+            self.git.checkout(self.inputs.ref_branch, self.workdir)
             working_branch = self.inputs.ref_branch
         else:
             if self.repo_created:
-                self.git.checkout("main")
+                self.git.checkout("main", self.workdir)
 
-        if self.git.is_status_changed():
-            self.git.add()
-            self.git.commit(self.inputs.pr_title)
-            self.git.push(working_branch)
+        status = self.git.status(self.workdir)
+        if status:
+            self.git.commit(self.inputs.pr_title, self.workdir, add_untracked=any(line.startswith("??") for line in status))
+            # Same as through the api: an existing setup branch gets the commit on top of its head, never a force-push
+            if working_branch == "main" or self.git.commit_on_remote_branch(
+                working_branch, [*self.generated_paths(), GENERATED_MANIFEST], self.inputs.pr_title, self.workdir
+            ):
+                self.git.push(working_branch, self.workdir)
 
             if not working_branch == "main":
-                return self.create_pull_request()
+                return self.pull_request()
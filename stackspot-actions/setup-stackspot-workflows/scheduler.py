@@ -0,0 +1,45 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+
+# REST calls, clone and push: bounded by the provider rate limits
+IO = "io"
+# stk apply plugin: bounded by the local cpus
+CPU = "cpu"
+
+
+class StageLimiter:
+    def __init__(self, io_limit: int, cpu_limit: int):
+        self.io_limit = io_limit
+        self.cpu_limit = cpu_limit
+        self.semaphores = {IO: threading.BoundedSemaphore(io_limit), CPU: threading.BoundedSemaphore(cpu_limit)}
+
+    @contextmanager
+    def __call__(self, kind: str):
+        with self.semaphores[kind]:
+            yield
+
+    @property
+    def workers(self) -> int:
+        return self.io_limit + self.cpu_limit
+
+
+def no_limit(kind: str):
+    return nullcontext()
+
+
+def default_cpu_limit() -> int:
+    return os.cpu_count() or 1
+
+
+def run_jobs(jobs: Iterable[Callable[[], T]], workers: int) -> List[T]:
+    jobs = list(jobs)
+    if workers <= 1 or len(jobs) <= 1:
+        return [job() for job in jobs]
+    with ThreadPoolExecutor(max_workers=min(workers, len(jobs)), thread_name_prefix="setup") as executor:
+        futures = [executor.submit(job) for job in jobs]
+        return [future.result() for future in futures]
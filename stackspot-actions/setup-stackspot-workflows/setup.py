@@ -1,26 +1,60 @@
-import os
 import shutil
 import logging
+from dataclasses import dataclass
+from typing import Callable, Optional
+
 from helpers import util
-from provider import Provider
-
-
-def setup(provider: Provider):
-    provider.validate_environment()
-    cwd = os.getcwd()
-    provider.create_project()
-    provider.create_repository()
-    try:
-        provider.clone_repository()
-        provider.create_workflow_manifest()
-        pr_link = provider.save_files_repository()
-        provider.extra_setup()
-    finally:
-        os.chdir(cwd)
-        shutil.rmtree(provider.workdir, onerror=util.on_delete_error, ignore_errors=True)
+from helpers.journal import SetupJournal
+from helpers.tracing import tracer
+from plan import TargetPlan
+from provider import PULL_REQUEST, Provider
+from scheduler import CPU, IO, StageLimiter, no_limit
+
+
+@dataclass(frozen=True)
+class SetupResult:
+    target: str
+    scm_config_url: str
+    pr_link: Optional[str] = None
+
+
+def run_stage(provider: Provider, stage: Callable, kind: str, name: str, journal: Optional[SetupJournal] = None):
+    if journal and journal.done(name):
+        logging.info(f"Skipping {name}, completed by a previous run.")
+        return journal.result(name)
+    with stage(kind), tracer.span(name, target=provider.target_name, stage_kind=kind):
+        result = getattr(provider, name)()
+    journal and journal.record(name, result=result, state=provider.checkpoint())
+    return result
+
+
+def setup(provider: Provider, limiter: Optional[StageLimiter] = None, plan: Optional[TargetPlan] = None) -> SetupResult:
+    stage = limiter or no_limit
+    journal = SetupJournal.open(provider.inputs.provider, provider.target_name, provider.inputs.ref_branch)
+    # Stages left out by the plan still leave the ids they would have read behind
+    plan and provider.restore(plan.state)
+    journal and provider.restore(journal.state)
+    planned = plan.needs if plan else lambda name: True
+    pr_link = plan.facts.get(PULL_REQUEST) if plan else None
+    with tracer.span("setup", target=provider.target_name):
+        run_stage(provider, no_limit, IO, "validate_environment")
+        planned("create_project") and run_stage(provider, stage, IO, "create_project", journal)
+        planned("create_repository") and run_stage(provider, stage, IO, "create_repository", journal)
+        try:
+            if planned("save_files_repository"):
+                # The working copy does not outlive a run, it is only needed until the files are saved
+                if not (journal and journal.done("save_files_repository")):
+                    run_stage(provider, stage, IO, "clone_repository")
+                    run_stage(provider, stage, CPU, "create_workflow_manifest")
+                pr_link = run_stage(provider, stage, IO, "save_files_repository", journal)
+            planned("extra_setup") and run_stage(provider, stage, IO, "extra_setup", journal)
+        finally:
+            shutil.rmtree(provider.workdir, onerror=util.on_delete_error, ignore_errors=True)
+    journal and journal.complete()
 
     logging.info("...")
     logging.info("Setup concluded successfully!")
     logging.info(f"Use this url: {provider.scm_config_url} into scm configuration page of Stackspot")
     pr_link and logging.info(f"Review and accept this pr: {pr_link} to use workflows!")
     logging.info("...")
+    return SetupResult(target=provider.target_name, scm_config_url=provider.scm_config_url, pr_link=pr_link)